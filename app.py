@@ -1,13 +1,36 @@
+import asyncio
+import gzip
+import html
+import io
+import logging
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+from src.cache import DEFAULT_CACHE_PATH, LLMCache
 from src.extractor import ClinicalNotesExtractor
-from src.utils import load_excel_notes, save_to_excel, validate_structured_data
+from src.utils import (
+    GZIP_COMPRESS_LEVEL, REQUIRED_FIELDS, has_clinical_content, load_excel_notes, save_to_excel,
+    validate_structured_data
+)
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Extractor diagnostics go to the console; set LOG_LEVEL=INFO for per-batch progress
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
 # Page configuration
 st.set_page_config(
     page_title="ClinicalNotes2Features",
@@ -15,7 +38,7 @@ st.set_page_config(
     layout="wide"
 )
 
-# Custom CSS
+# Custom CSS, title and description (static, sent as a single element)
 st.markdown("""
 <style>
     .main-header {
@@ -37,17 +60,50 @@ st.markdown("""
         text-align: center;
     }
 </style>
+<p class="main-header">🏥 ClinicalNotes2Features</p>
+<p class="sub-header">Transform unstructured clinical notes into structured features using AI</p>
 """, unsafe_allow_html=True)
 
-# Title and description
-st.markdown('<p class="main-header">🏥 ClinicalNotes2Features</p>', unsafe_allow_html=True)
-st.markdown('<p class="sub-header">Transform unstructured clinical notes into structured features using AI</p>', unsafe_allow_html=True)
+
+@st.cache_data(show_spinner=False)
+def parse_uploaded_notes(file_bytes: bytes, notes_column: str):
+    """Parse uploaded file contents once per (file content, notes column)"""
+    return load_excel_notes(io.BytesIO(file_bytes), notes_column)
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm_cache(use_disk_cache: bool, ttl_seconds: float = None):
+    """Result cache shared by all extractors: SQLite on disk when enabled, otherwise memory only"""
+    return LLMCache(path=DEFAULT_CACHE_PATH if use_disk_cache else None, ttl_seconds=ttl_seconds)
+
+
+@st.cache_resource(show_spinner=False)
+def get_extractor(
+    api_key: str,
+    model: str,
+    temperature: float,
+    use_disk_cache: bool,
+    base_url: str = None,
+    cache_ttl_seconds: float = None
+):
+    """Build the extractor (and its pooled Fireworks client) once per configuration"""
+    return ClinicalNotesExtractor(
+        api_key=api_key,
+        model=model,
+        temperature=temperature,
+        cache=get_llm_cache(use_disk_cache, cache_ttl_seconds),
+        base_url=base_url
+    )
+
 
 # Load configuration from environment variables
 api_key = os.getenv("FIREWORKS_API_KEY")
 model = os.getenv("MODEL", "accounts/fireworks/models/llama4-maverick-instruct-basic")
 temperature = float(os.getenv("TEMPERATURE", "0.0"))
 batch_size = int(os.getenv("BATCH_SIZE", "5"))
+requests_per_second = float(os.getenv("REQUESTS_PER_SECOND", "0")) or None
+base_url = os.getenv("FIREWORKS_BASE_URL") or None
+cache_ttl_seconds = float(os.getenv("CACHE_TTL_HOURS", "24")) * 3600 or None
 
 # Sidebar for configuration
 st.sidebar.header("⚙️ Configuration")
@@ -59,6 +115,45 @@ notes_column = st.sidebar.text_input(
     help="Name of the column containing clinical notes in your Excel file"
 )
 
+# Concurrency of API requests
+max_concurrency = st.sidebar.slider(
+    "⚡ Max Concurrent Requests",
+    min_value=1,
+    max_value=50,
+    value=int(os.getenv("MAX_CONCURRENCY", "20")),
+    help="Number of batches sent to the API in parallel"
+)
+
+# Reuse results of earlier runs stored on disk; opt-in because notes are stored in plaintext
+use_disk_cache = st.sidebar.checkbox(
+    "💾 Use Disk Cache",
+    value=False,
+    help=(
+        f"Keep extracted results in {DEFAULT_CACHE_PATH} so later runs skip notes already "
+        "extracted with the same model and settings. Note text and results are stored unencrypted; "
+        "entries expire after CACHE_TTL_HOURS"
+    )
+)
+
+if st.sidebar.button("🗑️ Clear Cache", help="Delete all cached extraction results, in memory and on disk"):
+    get_llm_cache(False, cache_ttl_seconds).clear()
+    if os.path.exists(DEFAULT_CACHE_PATH):
+        get_llm_cache(True, cache_ttl_seconds).clear()
+    st.sidebar.success("Cache cleared")
+
+# Excel export is slower than CSV, so it is opt-in
+export_excel = st.sidebar.checkbox(
+    "📊 Prepare Excel Download",
+    value=False,
+    help="Also build an Excel file (with original columns) after extraction"
+)
+
+compress_csv = st.sidebar.checkbox(
+    "🗜️ Compress CSV Download",
+    value=False,
+    help="Download the CSV gzip-compressed (.csv.gz); extracted text usually shrinks 5-10x"
+)
+
 st.sidebar.markdown("---")
 
 # Show current settings (read-only)
@@ -103,23 +198,39 @@ with st.expander("📋 View Sample Input Format"):
 # Process button
 if uploaded_file is not None:
     
+    if st.session_state.pop("extraction_cancelled", False):
+        st.info("⏹️ Extraction cancelled")
+    
     st.success("✅ File uploaded successfully!")
     
     # Display uploaded data preview
     try:
-        notes, original_df = load_excel_notes(uploaded_file, notes_column)
+        notes, original_df = parse_uploaded_notes(uploaded_file.getvalue(), notes_column)
         
         st.subheader("📊 Data Preview")
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("Total Notes Found", len(notes))
         with col2:
             st.metric("Total Columns", len(original_df.columns))
+        with col3:
+            # Same check the extraction uses to skip notes, so the count matches what is not sent
+            st.metric(
+                "Empty/Placeholder Notes",
+                sum(not has_clinical_content(note) for note in notes),
+                help="Blank rows and placeholders such as N/A or none are kept for alignment but never sent to the API"
+            )
         
         st.dataframe(original_df.head(10), use_container_width=True)
         
+        # Results are tied to this upload and notes column so a new file starts fresh
+        results_key = (uploaded_file.file_id, notes_column)
+        
         # Process button
-        if st.button("🚀 Extract Structured Features", type="primary", use_container_width=True):
+        extract_clicked = st.button("🚀 Extract Structured Features", type="primary", use_container_width=True)
+        
+        # "Retry failed notes" re-runs extraction; cached successes are not sent again
+        if extract_clicked or st.session_state.pop("retry_failed", False):
             
             if not api_key:
                 st.error("❌ Please set FIREWORKS_API_KEY in your .env file")
@@ -132,209 +243,319 @@ if uploaded_file is not None:
                 try:
                     # Initialize extractor
                     status_text.text("🔧 Initializing Fireworks AI extractor...")
-                    extractor = ClinicalNotesExtractor(
-                        api_key=api_key, 
-                        model=model,
-                        temperature=temperature
-                    )
+                    extractor = get_extractor(api_key, model, temperature, use_disk_cache, base_url, cache_ttl_seconds)
                     progress_bar.progress(10)
                     
                     # Extract features
                     model_name = model.split('/')[-1] if '/' in model else model
                     status_text.text(f"🔍 Extracting features from {len(notes)} notes using {model_name}...")
-                    structured_data = extractor.extract_batch(notes, batch_size=batch_size)
-                    progress_bar.progress(70)
                     
-                    # Validate data
-                    status_text.text("✔️ Validating extracted data...")
-                    if not validate_structured_data(structured_data):
-                        st.warning("⚠️ Some extracted data may not follow expected structure. Review the results carefully.")
-                    progress_bar.progress(85)
+                    def update_progress(current, total, message):
+                        progress_bar.progress(10 + int(60 * current / total))
+                        status_text.text(f"🔍 {message}")
                     
-                    # Display results
-                    status_text.text("📊 Preparing results...")
-                    st.subheader("✨ Extracted Structured Features")
+                    # Skip empty/placeholder notes without an API call
+                    has_content = [has_clinical_content(note) for note in notes]
+                    skipped_count = has_content.count(False)
+                    notes_to_send = [note for note, keep in zip(notes, has_content) if keep]
                     
-                    # Convert to DataFrame
-                    result_df = pd.DataFrame(structured_data)
+                    # The extractor's cache skips notes already extracted with the same model and prompt
+                    if notes_to_send:
+                        # Run extraction on a worker thread; the script thread only repaints progress
+                        progress_queue = queue.Queue()
+                        cancel_event = threading.Event()
+                        st.button(
+                            "⏹️ Cancel Extraction",
+                            on_click=lambda: st.session_state.update(extraction_cancelled=True),
+                            help="Stop sending new batches; results of this run are discarded"
+                        )
+                        
+                        with ThreadPoolExecutor(max_workers=1) as executor:
+                            future = executor.submit(asyncio.run, extractor.extract_batch_async(
+                                notes_to_send,
+                                batch_size=batch_size,
+                                max_concurrency=max_concurrency,
+                                progress_callback=lambda *update: progress_queue.put(update),
+                                requests_per_second=requests_per_second,
+                                cancel_event=cancel_event
+                            ))
+                            
+                            try:
+                                while not future.done() or not progress_queue.empty():
+                                    try:
+                                        update_progress(*progress_queue.get(timeout=0.1))
+                                    except queue.Empty:
+                                        pass
+                            finally:
+                                # A Cancel click (or any rerun) interrupts this loop; stop queued batches
+                                if not future.done():
+                                    cancel_event.set()
+                            
+                            sent_results = future.result()
+                    else:
+                        sent_results = []
                     
-                    # Display with tabs
-                    tab1, tab2, tab3 = st.tabs(["📋 Structured Data", "📊 Statistics", "🔍 Sample Results"])
+                    # Failed notes come back empty and are not cached, so a retry sends only them
+                    failed_count = sum(
+                        1 for result in sent_results
+                        if not any(str(value).strip() for value in result.values())
+                    )
                     
-                    with tab1:
-                        st.dataframe(result_df, use_container_width=True, height=400)
-                        st.caption(f"Showing all {len(result_df)} extracted records")
+                    # Reassemble results in note order, with empty records for skipped notes
+                    sent = iter(sent_results)
+                    structured_data = [
+                        dict(next(sent)) if keep else dict.fromkeys(REQUIRED_FIELDS, "")
+                        for keep in has_content
+                    ]
+                    progress_bar.progress(70)
                     
-                    with tab2:
-                        # Statistics - Updated for clinical note structure
-                        st.markdown("### 📈 Extraction Statistics")
-                        
-                        col1, col2, col3, col4 = st.columns(4)
-                        
-                        with col1:
-                            st.metric(
-                                "Total Notes Processed", 
-                                len(notes),
-                                help="Total number of clinical notes processed"
-                            )
-                        
-                        with col2:
-                            chief_complaints = sum(1 for item in structured_data if item.get("Chief_Complaint") and item.get("Chief_Complaint").strip())
-                            st.metric(
-                                "Chief Complaints", 
-                                chief_complaints,
-                                delta=f"{(chief_complaints/len(notes)*100):.1f}%" if len(notes) > 0 else "0%",
-                                help="Number of notes with chief complaint information"
-                            )
-                        
-                        with col3:
-                            hpi = sum(1 for item in structured_data if item.get("History_Present_Illness") and item.get("History_Present_Illness").strip())
-                            st.metric(
-                                "History Present Illness", 
-                                hpi,
-                                delta=f"{(hpi/len(notes)*100):.1f}%" if len(notes) > 0 else "0%",
-                                help="Number of notes with HPI information"
-                            )
-                        
-                        with col4:
-                            pmh = sum(1 for item in structured_data if item.get("Past_Medical_History") and item.get("Past_Medical_History").strip())
-                            st.metric(
-                                "Past Medical History", 
-                                pmh,
-                                delta=f"{(pmh/len(notes)*100):.1f}%" if len(notes) > 0 else "0%",
-                                help="Number of notes with past medical history"
-                            )
-                        
-                        # Additional statistics - Row 2
-                        st.markdown("---")
-                        col5, col6, col7, col8 = st.columns(4)
-                        
-                        with col5:
-                            medications = sum(1 for item in structured_data if item.get("Current_Medications") and item.get("Current_Medications").strip())
-                            st.metric("Current Medications", medications)
-                        
-                        with col6:
-                            allergies = sum(1 for item in structured_data if item.get("Allergies") and item.get("Allergies").strip())
-                            st.metric("Allergies", allergies)
-                        
-                        with col7:
-                            physical_exam = sum(1 for item in structured_data if item.get("Physical_Exam") and item.get("Physical_Exam").strip())
-                            st.metric("Physical Exams", physical_exam)
-                        
-                        with col8:
-                            ros = sum(1 for item in structured_data if item.get("Review_of_Systems") and item.get("Review_of_Systems").strip())
-                            st.metric("Review of Systems", ros)
-                        
-                        # Additional statistics - Row 3
-                        st.markdown("---")
-                        col9, col10, col11 = st.columns(3)
-                        
-                        with col9:
-                            labs = sum(1 for item in structured_data if item.get("Labs_Imaging_Results") and item.get("Labs_Imaging_Results").strip())
-                            st.metric("Labs/Imaging", labs)
-                        
-                        with col10:
-                            assessment = sum(1 for item in structured_data if item.get("Assessment_Impression") and item.get("Assessment_Impression").strip())
-                            st.metric("Assessment/Impression", assessment)
-                        
-                        with col11:
-                            plan = sum(1 for item in structured_data if item.get("Plan") and item.get("Plan").strip())
-                            st.metric("Treatment Plans", plan)
-                        
-                        # Field completion chart
-                        st.markdown("### 📊 Field Completion Rate")
-                        field_completion = {}
-                        field_labels = {
-                            "Chief_Complaint": "Chief Complaint",
-                            "History_Present_Illness": "History Present Illness", 
-                            "Past_Medical_History": "Past Medical History",
-                            "Current_Medications": "Current Medications",
-                            "Allergies": "Allergies",
-                            "Physical_Exam": "Physical Exam",
-                            "Review_of_Systems": "Review of Systems",
-                            "Labs_Imaging_Results": "Labs/Imaging Results",
-                            "Assessment_Impression": "Assessment/Impression",
-                            "Plan": "Treatment Plan"
-                        }
-                        
-                        for field in result_df.columns:
-                            non_empty = sum(1 for val in result_df[field] if val and str(val).strip())
-                            completion_rate = (non_empty / len(result_df) * 100) if len(result_df) > 0 else 0
-                            field_name = field_labels.get(field, field)
-                            field_completion[field_name] = completion_rate
-                        
-                        completion_df = pd.DataFrame({
-                            'Field': list(field_completion.keys()),
-                            'Completion %': list(field_completion.values())
-                        })
-                        st.bar_chart(completion_df.set_index('Field'))
+                    # Validate data
+                    status_text.text("✔️ Validating extracted data...")
+                    is_valid = validate_structured_data(structured_data)
+                    progress_bar.progress(85)
                     
-                    with tab3:
-                        st.markdown("### 🔍 Sample Extracted Records")
-                        num_samples = min(5, len(result_df))
-                        for i in range(num_samples):
-                            with st.expander(f"Record {i+1}: {notes[i][:100]}..."):
-                                col_a, col_b = st.columns(2)
-                                with col_a:
-                                    st.markdown("**Original Note:**")
-                                    st.info(notes[i])
-                                with col_b:
-                                    st.markdown("**Extracted Features:**")
-                                    
-                                    # Display extracted features in a more readable format
-                                    extracted = structured_data[i]
-                                    for field, value in extracted.items():
-                                        if value and str(value).strip():
-                                            field_name = field_labels.get(field, field)
-                                            st.markdown(f"**{field_name}:** {value}")
+                    # Convert to DataFrame
+                    status_text.text("📊 Preparing results...")
+                    # Arrow-backed strings (non-string values are stringified, missing stay NA)
+                    result_df = pd.DataFrame(structured_data).astype("string[pyarrow]")
+                    result_table = pa.Table.from_pandas(result_df, preserve_index=False)
                     
+                    # Non-empty mask computed once with Arrow compute kernels and shared by all tabs
+                    mask = np.column_stack([
+                        pc.fill_null(pc.greater(pc.utf8_length(pc.utf8_trim_whitespace(column)), 0), False).to_numpy()
+                        for column in result_table.columns
+                    ])
+                    non_empty = pd.Series(mask.sum(axis=0), index=result_df.columns)
                     progress_bar.progress(95)
                     
-                    # Download button
+                    # Prepare downloads
                     status_text.text("💾 Preparing download...")
-                    excel_data = save_to_excel(structured_data, original_df)
+                    csv_buffer = pa.BufferOutputStream()
+                    pa_csv.write_csv(result_table, csv_buffer)
+                    csv_data = csv_buffer.getvalue().to_pybytes()
+                    if compress_csv:
+                        csv_data = gzip.compress(csv_data, compresslevel=GZIP_COMPRESS_LEVEL)
+                    excel_data = save_to_excel(structured_data, original_df) if export_excel else None
                     progress_bar.progress(100)
                     status_text.text("✅ Extraction complete!")
                     
-                    st.markdown("---")
-                    st.subheader("📥 Download Results")
-                    
-                    col_dl1, col_dl2 = st.columns(2)
-                    
-                    with col_dl1:
-                        st.download_button(
-                            label="📥 Download Structured Features (Excel)",
-                            data=excel_data,
-                            file_name=f"clinical_features_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                    
-                    with col_dl2:
-                        csv_data = result_df.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            label="📥 Download as CSV",
-                            data=csv_data,
-                            file_name=f"clinical_features_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv",
-                            use_container_width=True
-                        )
-                    
-                    # Success message
-                    st.success("🎉 Clinical feature extraction completed successfully!")
+                    # Keep results and derived statistics across reruns (e.g. paging through the table)
+                    st.session_state["extraction"] = {
+                        "key": results_key,
+                        "structured_data": structured_data,
+                        "result_df": result_df,
+                        "mask": mask,
+                        "non_empty": non_empty,
+                        "is_valid": is_valid,
+                        "skipped_count": skipped_count,
+                        "failed_count": failed_count,
+                        "csv_data": csv_data,
+                        "csv_compressed": compress_csv,
+                        "excel_data": excel_data,
+                        "timestamp": pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
+                    }
                     
                 except Exception as e:
                     st.error(f"❌ Error during extraction: {str(e)}")
                     with st.expander("🔍 View Error Details"):
-                        import traceback
                         st.code(traceback.format_exc())
                     progress_bar.empty()
                     status_text.empty()
         
+        # Display results of the last extraction for this file
+        extraction = st.session_state.get("extraction")
+        if extraction is not None and extraction["key"] == results_key:
+            result_df = extraction["result_df"]
+            mask = extraction["mask"]
+            non_empty = extraction["non_empty"]
+            csv_data = extraction["csv_data"]
+            csv_compressed = extraction["csv_compressed"]
+            excel_data = extraction["excel_data"]
+            timestamp = extraction["timestamp"]
+            
+            if extraction["skipped_count"]:
+                st.info(f"ℹ️ Skipped {extraction['skipped_count']} empty or placeholder notes (no API call made)")
+            
+            if extraction["failed_count"]:
+                st.warning(f"⚠️ {extraction['failed_count']} note(s) returned no data after all retries")
+                st.button(
+                    "🔁 Retry Failed Notes",
+                    on_click=lambda: st.session_state.update(retry_failed=True),
+                    help="Re-send only the notes that returned no data"
+                )
+            
+            if not extraction["is_valid"]:
+                st.warning("⚠️ Some extracted data may not follow expected structure. Review the results carefully.")
+            
+            st.subheader("✨ Extracted Structured Features")
+            
+            # Display labels for each extracted field
+            field_labels = {
+                "Chief_Complaint": "Chief Complaint",
+                "History_Present_Illness": "History Present Illness", 
+                "Past_Medical_History": "Past Medical History",
+                "Current_Medications": "Current Medications",
+                "Allergies": "Allergies",
+                "Physical_Exam": "Physical Exam",
+                "Review_of_Systems": "Review of Systems",
+                "Labs_Imaging_Results": "Labs/Imaging Results",
+                "Assessment_Impression": "Assessment/Impression",
+                "Plan": "Treatment Plan"
+            }
+            pretty_cols = [field_labels.get(col, col) for col in result_df.columns]
+            
+            # Display with tabs
+            tab1, tab2, tab3 = st.tabs(["📋 Structured Data", "📊 Statistics", "🔍 Sample Results"])
+            
+            with tab1:
+                # Only send one page of rows to the browser
+                page_size = 50
+                total_pages = max((len(result_df) - 1) // page_size + 1, 1)
+                page = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+                start = (page - 1) * page_size
+                st.dataframe(result_df.iloc[start:start + page_size], use_container_width=True, height=400)
+                st.caption(f"Showing records {start + 1}-{min(start + page_size, len(result_df))} of {len(result_df)} (page {page}/{total_pages})")
+            
+            with tab2:
+                # Statistics - Updated for clinical note structure
+                st.markdown("### 📈 Extraction Statistics")
+                
+                total_notes = len(notes)
+                
+                def pct(count):
+                    return f"{count * 100 / total_notes:.1f}%" if total_notes else "0%"
+                
+                col1, col2, col3, col4 = st.columns(4)
+                
+                with col1:
+                    st.metric(
+                        "Total Notes Processed", 
+                        total_notes,
+                        help="Total number of clinical notes processed"
+                    )
+                
+                with col2:
+                    chief_complaints = int(non_empty.get("Chief_Complaint", 0))
+                    st.metric(
+                        "Chief Complaints", 
+                        chief_complaints,
+                        delta=pct(chief_complaints),
+                        help="Number of notes with chief complaint information"
+                    )
+                
+                with col3:
+                    hpi = int(non_empty.get("History_Present_Illness", 0))
+                    st.metric(
+                        "History Present Illness", 
+                        hpi,
+                        delta=pct(hpi),
+                        help="Number of notes with HPI information"
+                    )
+                
+                with col4:
+                    pmh = int(non_empty.get("Past_Medical_History", 0))
+                    st.metric(
+                        "Past Medical History", 
+                        pmh,
+                        delta=pct(pmh),
+                        help="Number of notes with past medical history"
+                    )
+                
+                # Additional statistics - Row 2
+                st.markdown("---")
+                col5, col6, col7, col8 = st.columns(4)
+                
+                with col5:
+                    medications = int(non_empty.get("Current_Medications", 0))
+                    st.metric("Current Medications", medications)
+                
+                with col6:
+                    allergies = int(non_empty.get("Allergies", 0))
+                    st.metric("Allergies", allergies)
+                
+                with col7:
+                    physical_exam = int(non_empty.get("Physical_Exam", 0))
+                    st.metric("Physical Exams", physical_exam)
+                
+                with col8:
+                    ros = int(non_empty.get("Review_of_Systems", 0))
+                    st.metric("Review of Systems", ros)
+                
+                # Additional statistics - Row 3
+                st.markdown("---")
+                col9, col10, col11 = st.columns(3)
+                
+                with col9:
+                    labs = int(non_empty.get("Labs_Imaging_Results", 0))
+                    st.metric("Labs/Imaging", labs)
+                
+                with col10:
+                    assessment = int(non_empty.get("Assessment_Impression", 0))
+                    st.metric("Assessment/Impression", assessment)
+                
+                with col11:
+                    plan = int(non_empty.get("Plan", 0))
+                    st.metric("Treatment Plans", plan)
+                
+                # Field completion chart
+                st.markdown("### 📊 Field Completion Rate")
+                completion_df = (non_empty / max(len(result_df), 1) * 100).rename(index=field_labels)
+                completion_df = completion_df.rename_axis('Field').to_frame('Completion %')
+                st.bar_chart(completion_df)
+            
+            with tab3:
+                st.markdown("### 🔍 Sample Extracted Records")
+                num_samples = min(5, len(result_df))
+                
+                # Render all samples as one HTML block instead of ~12 widgets per record
+                samples_html = []
+                for i in range(num_samples):
+                    features_html = "".join(
+                        f"<li><b>{html.escape(field_name)}:</b> {html.escape(str(result_df.iat[i, col_pos]))}</li>"
+                        for col_pos, field_name in enumerate(pretty_cols)
+                        if mask[i, col_pos]
+                    )
+                    samples_html.append(
+                        f"<details><summary>Record {i+1}: {html.escape(notes[i][:100])}...</summary>"
+                        f"<p><b>Original Note:</b><br>{html.escape(notes[i])}</p>"
+                        f"<p><b>Extracted Features:</b></p><ul>{features_html}</ul>"
+                        f"</details>"
+                    )
+                st.markdown("".join(samples_html), unsafe_allow_html=True)
+            
+            # Download button
+            st.markdown("---")
+            st.subheader("📥 Download Results")
+            
+            col_dl1, col_dl2 = st.columns(2)
+            
+            with col_dl1:
+                st.download_button(
+                    label="📥 Download as CSV",
+                    data=csv_data,
+                    file_name=f"clinical_features_{timestamp}.csv" + (".gz" if csv_compressed else ""),
+                    mime="application/gzip" if csv_compressed else "text/csv",
+                    use_container_width=True
+                )
+            
+            with col_dl2:
+                if excel_data is not None:
+                    st.download_button(
+                        label="📥 Download Structured Features (Excel)",
+                        data=excel_data,
+                        file_name=f"clinical_features_{timestamp}.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        use_container_width=True
+                    )
+                else:
+                    st.caption("Enable **Prepare Excel Download** in the sidebar to also export as Excel")
+            
+            # Success message
+            st.success("🎉 Clinical feature extraction completed successfully!")
+        
     except Exception as e:
         st.error(f"❌ Error loading file: {str(e)}")
         with st.expander("🔍 View Error Details"):
-            import traceback
             st.code(traceback.format_exc())
 
 else:
@@ -404,8 +625,8 @@ else:
         """)
 
 # Footer
-st.markdown("---")
 st.markdown("""
+<hr>
 <div style='text-align: center; color: #666;'>
     <p><strong>🏥 ClinicalNotes2Features</strong> | Powered by Fireworks AI & Llama Models</p>
     <p style='font-size: 0.9rem;'>Transform unstructured clinical notes into structured clinical components</p>
@@ -428,4 +649,8 @@ Model settings from `.env` file:
 - `MODEL`
 - `TEMPERATURE`
 - `BATCH_SIZE`
+- `MAX_CONCURRENCY`
+- `REQUESTS_PER_SECOND`
+- `CACHE_TTL_HOURS`
+- `FIREWORKS_BASE_URL` (optional)
                 """, unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Dict, Iterable, Optional
+import orjson
+
+# Default location of the on-disk cache database
+DEFAULT_CACHE_PATH = ".cache/llm_cache.sqlite3"
+
+
+class LLMCache:
+    """
+    SQLite-backed cache of extraction results keyed on a SHA-256 prompt hash,
+    with recently used entries also kept in memory (or only in memory, with path=None)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        ttl_seconds: Optional[float] = None,
+        memory_entries: int = 10000
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            path: Path of the SQLite database file (created if missing); None keeps entries in memory only
+            ttl_seconds: Optional maximum age of entries; older entries are ignored
+            memory_entries: Number of recent entries also kept in memory (0 disables)
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        # In-process LRU tier in front of SQLite: key -> (created, result)
+        self._memory = OrderedDict()
+
+        if path is None:
+            if memory_entries <= 0:
+                raise ValueError("A memory-only cache needs memory_entries > 0")
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock, closing(sqlite3.connect(self.path)) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, response TEXT, created REAL)"
+            )
+            conn.commit()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, system_prompt: str, note: str) -> str:
+        """
+        Build the cache key for one note
+
+        Args:
+            model: Model name
+            temperature: Generation temperature
+            system_prompt: System prompt sent with the note
+            note: Clinical note text
+
+        Returns:
+            Hex SHA-256 digest identifying the request
+        """
+        payload = "\x00".join([model, str(temperature), system_prompt, note])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Look up several keys at once
+
+        Args:
+            keys: Cache keys to look up
+
+        Returns:
+            Dictionary mapping each found key to its cached result
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        min_created = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+        found = {}
+
+        with self._lock:
+            missing = []
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is not None and entry[0] >= min_created:
+                    self._memory.move_to_end(key)
+                    found[key] = dict(entry[1])
+                else:
+                    missing.append(key)
+
+            if not missing or self.path is None:
+                return found
+
+            with closing(sqlite3.connect(self.path)) as conn:
+                # Stay well under SQLite's bound-parameter limit
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT key, response, created FROM cache WHERE key IN ({placeholders}) AND created >= ?",
+                        [*chunk, min_created]
+                    )
+                    for key, response, created in rows:
+                        found[key] = orjson.loads(response)
+                        self._remember(key, created, found[key])
+
+        return found
+
+    def set_many(self, items: Dict[str, Dict]):
+        """
+        Store several results at once
+
+        Args:
+            items: Dictionary mapping cache keys to extraction results
+        """
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            if self.path is not None:
+                with closing(sqlite3.connect(self.path)) as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO cache (key, response, created) VALUES (?, ?, ?)",
+                        [(key, orjson.dumps(value).decode("utf-8"), now) for key, value in items.items()]
+                    )
+                    conn.commit()
+            for key, value in items.items():
+                self._remember(key, now, value)
+
+    def _remember(self, key: str, created: float, value: Dict):
+        """Store a copy in the in-memory tier, evicting the least recently used entries (lock held)"""
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = (created, dict(value))
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached entries, and compact the database so their text is not left on disk"""
+        with self._lock:
+            if self.path is not None:
+                with closing(sqlite3.connect(self.path)) as conn:
+                    conn.execute("DELETE FROM cache")
+                    conn.commit()
+                    conn.execute("VACUUM")
+            self._memory.clear()
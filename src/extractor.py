@@ -1,9 +1,220 @@
+import asyncio
 import json
+import logging
+import random
 import re
+import threading
 import time 
-from typing import List, Dict, Optional
-from fireworks.client import Fireworks
-from .prompts import SYSTEM_PROMPT, get_user_prompt
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+from typing import List, Dict, Iterable, Iterator, Mapping, Optional, Tuple
+import orjson
+from fireworks.client import Fireworks, AsyncFireworks
+from fireworks.client.error import AuthenticationError, InvalidRequestError, PermissionError as APIPermissionError
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+from .cache import LLMCache
+from .prompts import FIELD_ALIASES, PROMPT_FINGERPRINT, SYSTEM_PROMPT, get_user_prompt
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on max_tokens for a single request
+MAX_OUTPUT_TOKENS = 4096
+
+# API errors that will fail the same way on every attempt
+_NON_RETRYABLE_ERRORS = (AuthenticationError, InvalidRequestError, APIPermissionError)
+
+# Output tokens reserved for the JSON wrapper around the per-note records
+_OUTPUT_TOKEN_OVERHEAD = 200
+
+# Upper bound on the wait between retries of a failed request
+MAX_BACKOFF_SECONDS = 30
+
+# Fields of the clinical note structure, in output column order
+_FIELDS = (
+    "Chief_Complaint", "History_Present_Illness", "Past_Medical_History",
+    "Current_Medications", "Allergies", "Physical_Exam",
+    "Review_of_Systems", "Labs_Imaging_Results",
+    "Assessment_Impression", "Plan"
+)
+# Template copied for every empty result
+_EMPTY_TEMPLATE = dict.fromkeys(_FIELDS, "")
+_EMPTY_FROZEN = MappingProxyType(_EMPTY_TEMPLATE)
+# Full names and the short output keys from the prompt are both recognized
+_EXPECTED = frozenset(_FIELDS) | frozenset(FIELD_ALIASES)
+# An object is accepted once at least half of the expected fields are present
+_THRESHOLD = len(_FIELDS) // 2
+
+# Built once so every request starts with a byte-identical, cacheable prefix
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Output schema sent with each request; fields use the prompt's short keys as aliases
+_ExtractedRecord = create_model(
+    "ExtractedRecord",
+    __config__=ConfigDict(populate_by_name=True),
+    **{field: (str, Field("", alias=alias)) for alias, field in FIELD_ALIASES.items()}
+)
+
+
+class _ExtractionOutput(BaseModel):
+    """Top-level JSON object the model is asked to return"""
+    results: List[_ExtractedRecord]
+
+
+_OUTPUT_SCHEMA = _ExtractionOutput.model_json_schema()
+
+# Keys a response may wrap its record list in, most likely first
+_WRAPPER_KEYS = ("results", "features", "data", "notes", "extracted_features")
+
+# Fallback parsing of JSON embedded in surrounding text
+_DECODER = json.JSONDecoder()
+_JSON_START = re.compile(r"[\[{]")
+_MAX_JSON_CANDIDATES = 20
+# Comma left before a closing bracket, a common LLM JSON slip
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+# Markdown code fence (optionally tagged json) at either end of a response
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?|```\s*$", re.IGNORECASE)
+
+# Responses longer than this are parsed off the event loop; fallback scans can be slow
+_OFFLOAD_PARSE_CHARS = 32768
+
+
+class AsyncRateLimiter:
+    """
+    Space out request starts to at most `rate` per second within one event loop
+    """
+    
+    def __init__(self, rate: float):
+        """
+        Initialize the rate limiter
+        
+        Args:
+            rate: Maximum number of requests started per second
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        
+        self.interval = 1.0 / rate
+        self._next_start = 0.0
+    
+    async def wait(self):
+        """Wait until the next request slot is available"""
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next_start)
+        self._next_start = start + self.interval
+        
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class RateLimiter:
+    """
+    Space out request starts to at most `rate` per second across threads
+    """
+    
+    def __init__(self, rate: float):
+        """
+        Initialize the rate limiter
+        
+        Args:
+            rate: Maximum number of requests started per second
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        
+        self.interval = 1.0 / rate
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Block until the next request slot is available"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        
+        if start > now:
+            time.sleep(start - now)
+
+
+class StreamingRecordCounter:
+    """
+    Count records completed so far in a streamed JSON response
+    
+    Tracks container nesting (ignoring braces inside strings) and counts
+    every object that closes directly inside an array, i.e. each entry of
+    a "results" array or of a bare top-level array. With keep_records, the
+    text of each completed record is also kept for pop_records().
+    """
+    
+    def __init__(self, keep_records: bool = False):
+        """
+        Initialize an empty counter
+        
+        Args:
+            keep_records: Whether to collect the JSON text of completed records
+        """
+        self.count = 0
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._keep_records = keep_records
+        self._record_depth = None
+        self._partial = ""
+        self._records = []
+    
+    def feed(self, text: str) -> int:
+        """
+        Consume the next chunk of streamed text
+        
+        Args:
+            text: Next piece of the response content
+            
+        Returns:
+            Total number of records completed so far
+        """
+        # Offset in this chunk where the record being read started (0 if it began earlier)
+        start = 0
+        
+        for pos, char in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._stack and self._stack[-1] == "[" and self._record_depth is None:
+                    self._record_depth = len(self._stack)
+                    start = pos
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                closed = self._stack.pop()
+                if closed == "{" and self._stack and self._stack[-1] == "[":
+                    self.count += 1
+                if self._record_depth is not None and len(self._stack) == self._record_depth:
+                    if self._keep_records:
+                        self._records.append(self._partial + text[start:pos + 1])
+                    self._partial = ""
+                    self._record_depth = None
+        
+        if self._keep_records and self._record_depth is not None:
+            self._partial += text[start:]
+        
+        return self.count
+    
+    def pop_records(self) -> List[str]:
+        """
+        Take the JSON text of records completed since the last call
+        
+        Returns:
+            List of JSON object strings, in stream order
+        """
+        records, self._records = self._records, []
+        return records
 
 
 class ClinicalNotesExtractor:
@@ -17,7 +228,11 @@ class ClinicalNotesExtractor:
         model: str = "accounts/fireworks/models/llama4-maverick-instruct-basic", 
         temperature: float = 0.0, 
         max_retries: int = 3,
-        timeout: int = 60
+        timeout: int = 60,
+        cache: Optional[LLMCache] = None,
+        per_note_token_budget: int = 300,
+        max_batch_tokens: int = 3000,
+        base_url: Optional[str] = None
     ):
         """
         Initialize the extractor
@@ -28,6 +243,12 @@ class ClinicalNotesExtractor:
             temperature: Temperature for generation
             max_retries: Maximum number of retry attempts
             timeout: Request timeout in seconds
+            cache: Optional LLMCache; notes already cached are not sent to the API
+            per_note_token_budget: Minimum output tokens reserved per note in a request
+            max_batch_tokens: Approximate input tokens of notes packed into one request
+            base_url: Optional API endpoint, e.g. a dedicated deployment's direct-routing
+                URL (https://<deployment>.direct.fireworks.ai/inference/v1); defaults
+                to the SDK's public endpoint
         """
         # Validate API key
         if not api_key or not api_key.strip():
@@ -38,100 +259,551 @@ class ClinicalNotesExtractor:
         self.temperature = temperature
         self.max_retries = max_retries
         self.timeout = timeout
+        self.cache = cache
+        self.per_note_token_budget = per_note_token_budget
+        self.max_batch_tokens = max_batch_tokens
+        # Shared by the sync and per-loop async clients
+        self._client_options = {"api_key": api_key, "timeout": timeout}
+        if base_url:
+            self._client_options["base_url"] = base_url
 
-        # Initialize client with error handling
+        # Initialize client with error handling (one pooled keep-alive client per extractor)
         try:
-            self.client = Fireworks(api_key=api_key)
+            self.client = Fireworks(**self._client_options)
         except Exception as e:
             raise ConnectionError(f"Failed to initialize Fireworks client: {str(e)}")       
+        
+        # Async clients are created per event loop, since pooled connections are loop-bound
+        self._async_clients = weakref.WeakKeyDictionary()
          
-    def extract_features(self, notes: List[str], retry_count: int = 0) -> List[Dict]:
+    def extract_features(self, notes: List[str], rate_limiter: Optional[RateLimiter] = None) -> List[Dict]:
         """
         Extract structured features from a list of clinical notes with retry logic
         
         Args:
             notes: List of clinical note strings
-            retry_count: Current retry attempt (internal use)
+            rate_limiter: Optional limiter waited on before every API request (cache hits skip it)
             
         Returns:
             List of dictionaries containing structured features
         """
+        # Send each distinct note once; the unique list recurses straight through
+        unique, positions = self._unique_notes(notes)
+        if len(unique) < len(notes):
+            return self._expand_results(self.extract_features(unique, rate_limiter) if unique else [], positions)
+
+        if self.cache is None:
+            return self._extract_features(notes, rate_limiter)
+        
+        # Only send notes missing from the cache
+        keys, cached = self._lookup_cache(notes)
+        missing = [note for key, note in zip(keys, notes) if key not in cached]
+        results = self._extract_features(missing, rate_limiter) if missing else []
+        
+        return self._merge_cached(keys, cached, results)
+    
+    def _extract_features(self, notes: List[str], rate_limiter: Optional[RateLimiter] = None) -> List[Dict]:
+        """
+        Extract structured features via the API, bypassing the cache
+        
+        Args:
+            notes: List of clinical note strings
+            rate_limiter: Optional limiter waited on before every API request
+            
+        Returns:
+            List of dictionaries containing structured features
+        """
+        # Built once and reused on every attempt
+        request = self._build_request(notes)
+        
+        for attempt in range(self.max_retries):
+            try:
+                if rate_limiter:
+                    rate_limiter.wait()
+                
+                # Call Fireworks AI API
+                response = self.client.chat.completions.create(**request)
+                structured_data = self._handle_response(response)
+                
+                # Fall back to one request per note if the batch came back misaligned
+                if len(structured_data) != len(notes) and len(notes) > 1:
+                    logger.warning("Expected %d results, got %d - retrying notes individually", len(notes), len(structured_data))
+                    return [self._extract_features([note], rate_limiter)[0] for note in notes]
+                
+                return self._align_results(structured_data, notes)
+                
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    break
+                wait_time = self._backoff_delay(attempt)
+                logger.info("Retrying in %.1f seconds...", wait_time)
+                time.sleep(wait_time)
+        
+        # Return empty structures as fallback
+        return self._get_empty_structures(len(notes))
+    
+    def extract_features_stream(self, notes: List[str]) -> Iterator[Dict]:
+        """
+        Extract features with a streamed request, yielding each note's result as it arrives
+        
+        Records are parsed as soon as their closing brace is received, so callers
+        can start on the first notes while the rest are still being generated.
+        Blank notes, the cache and retries are not handled here; if the stream
+        fails or ends early, the remaining notes get empty structures.
+        
+        Args:
+            notes: List of clinical note strings
+            
+        Yields:
+            One structured dictionary per note, in order
+        """
+        counter = StreamingRecordCounter(keep_records=True)
+        produced = 0
+        
         try:
-            # Validate input
-            if not notes or len(notes) == 0:
-                raise ValueError("Notes list cannot be empty")
-            
-            # Create the user prompt
-            user_prompt = get_user_prompt(notes)
-            
-            # Calculate dynamic max_tokens
-            estimated_tokens = len(user_prompt) // 4
-            max_tokens = min(4096, max(1000, estimated_tokens * 2))
-            
-            # Call Fireworks AI API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=max_tokens,
-                response_format={"type": "json_object"}
-            )
-            
-            # Validate response
-            if not response or not response.choices:
-                raise ValueError("Empty response from API")
-            
-            # Extract the response content
-            content = response.choices[0].message.content
-            
-            if not content or not content.strip():
-                raise ValueError("Empty content in API response")
-            
-            # Parse JSON response
-            structured_data = self._parse_response(content)
-            
-            # Validate parsed data
-            if not structured_data:
-                raise ValueError("Failed to parse response into structured data")
-            
-            # Handle length mismatch
-            if len(structured_data) != len(notes):
-                print(f"⚠️ Warning: Expected {len(notes)} results, got {len(structured_data)}")
+            stream = self.client.chat.completions.create(**self._build_request(notes), stream=True)
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                
+                counter.feed(delta)
+                for text in counter.pop_records():
+                    if produced == len(notes):
+                        break
+                    try:
+                        record = self._expand_keys(orjson.loads(text))
+                    except orjson.JSONDecodeError as e:
+                        logger.warning("Failed to parse streamed record: %s", e)
+                        record = self._get_empty_structure()
+                    produced += 1
+                    yield record
+        
+        except Exception as e:
+            logger.error("Streaming extraction failed after %d/%d notes: %s", produced, len(notes), e)
+        
+        # Pad notes the stream did not cover
+        if produced < len(notes):
+            logger.warning("Padding %d missing records", len(notes) - produced)
+        for _ in range(len(notes) - produced):
+            yield self._get_empty_structure()
+    
+    async def extract_features_async(
+        self,
+        notes: List[str],
+        record_callback=None,
+        rate_limiter: Optional[AsyncRateLimiter] = None
+    ) -> List[Dict]:
+        """
+        Async variant of extract_features using the AsyncFireworks client
+        
+        Args:
+            notes: List of clinical note strings
+            record_callback: Optional callback function(records_completed); when set,
+                the response is streamed and the callback fires as each record arrives
+            rate_limiter: Optional limiter awaited before every API request (cache hits skip it)
+            
+        Returns:
+            List of dictionaries containing structured features
+        """
+        if self.cache is None:
+            return await self._extract_features_async(notes, record_callback, rate_limiter)
+        
+        # Only send notes missing from the cache
+        keys, cached = self._lookup_cache(notes)
+        missing = [note for key, note in zip(keys, notes) if key not in cached]
+        results = await self._extract_features_async(missing, record_callback, rate_limiter) if missing else []
+        
+        return self._merge_cached(keys, cached, results)
+    
+    async def _extract_features_async(
+        self,
+        notes: List[str],
+        record_callback=None,
+        rate_limiter: Optional[AsyncRateLimiter] = None
+    ) -> List[Dict]:
+        """
+        Async extraction via the API, bypassing the cache
+        
+        Args:
+            notes: List of clinical note strings
+            record_callback: Optional callback function(records_completed) for streamed records
+            rate_limiter: Optional limiter awaited before every API request
+            
+        Returns:
+            List of dictionaries containing structured features
+        """
+        # Built once and reused on every attempt
+        request = self._build_request(notes)
+        
+        for attempt in range(self.max_retries):
+            try:
+                if rate_limiter:
+                    await rate_limiter.wait()
+                
+                # Call Fireworks AI API without blocking the event loop
+                if record_callback:
+                    content = await self._stream_content_async(request, record_callback)
+                else:
+                    response = await self._get_async_client().chat.completions.acreate(**request)
+                    content = self._response_content(response)
+                structured_data = await self._handle_content_async(content)
                 
-                # If too few, pad with empty structures
-                if len(structured_data) < len(notes):
-                    print(f"   Padding {len(notes) - len(structured_data)} missing records")
-                    while len(structured_data) < len(notes):
-                        structured_data.append(self._get_empty_structure())
+                # Fall back to one request per note if the batch came back misaligned
+                if len(structured_data) != len(notes) and len(notes) > 1:
+                    logger.warning("Expected %d results, got %d - retrying notes individually", len(notes), len(structured_data))
+                    # One at a time, so the retries stay within the caller's concurrency and rate limits
+                    results = []
+                    for note in notes:
+                        results.append((await self._extract_features_async([note], rate_limiter=rate_limiter))[0])
+                    return results
                 
-                # If too many, truncate
-                elif len(structured_data) > len(notes):
-                    print(f"   Truncating {len(structured_data) - len(notes)} extra records")
-                    structured_data = structured_data[:len(notes)]
+                return self._align_results(structured_data, notes)
+                
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    break
+                wait_time = self._backoff_delay(attempt)
+                logger.info("Retrying in %.1f seconds...", wait_time)
+                await asyncio.sleep(wait_time)
+        
+        # Return empty structures as fallback
+        return self._get_empty_structures(len(notes))
+    
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        """
+        Log a failed attempt and decide whether another attempt is worthwhile
+        
+        Rate limits, server errors, timeouts, network errors and unparseable
+        output are retried; rejected requests (bad request, auth) are not.
+        
+        Args:
+            error: Exception raised by the attempt
+            attempt: Attempt number (0-based)
+            
+        Returns:
+            True if the request should be retried
+        """
+        logger.warning("Error during extraction (attempt %d/%d): %s", attempt + 1, self.max_retries, error)
+        
+        if isinstance(error, _NON_RETRYABLE_ERRORS):
+            logger.error("Request rejected by the API, not retrying")
+            return False
+        if attempt < self.max_retries - 1:
+            return True
+        
+        # All retries exhausted
+        logger.error("All %d retry attempts failed", self.max_retries, exc_info=error)
+        return False
+    
+    def _lookup_cache(self, notes: List[str]) -> Tuple[List[str], Dict[str, Dict]]:
+        """
+        Compute cache keys for notes and fetch any cached results
+        
+        Args:
+            notes: List of clinical note strings
             
-            return structured_data
+        Returns:
+            Tuple of (cache key per note, dictionary of cached results by key)
+        """
+        # All static prompt text is hashed, so editing any of it invalidates old entries
+        keys = [LLMCache.make_key(self.model, self.temperature, PROMPT_FINGERPRINT, note) for note in notes]
+        try:
+            return keys, self.cache.get_many(keys)
+        except Exception as e:
+            logger.warning("Cache lookup failed, calling API for all notes: %s", e)
+            return keys, {}
+    
+    def _merge_cached(self, keys: List[str], cached: Dict[str, Dict], fresh_results: List[Dict]) -> List[Dict]:
+        """
+        Merge cached and freshly extracted results back into note order
+        
+        Fresh results with at least one populated field are written to the
+        cache; empty fallbacks from failed calls are not, so they get retried.
+        
+        Args:
+            keys: Cache key per note, in note order
+            cached: Cached results by key
+            fresh_results: Results for the notes missing from the cache, in order
             
+        Returns:
+            List of structured dictionaries aligned with keys
+        """
+        fresh = iter(fresh_results)
+        results = []
+        to_store = {}
+        
+        for key in keys:
+            if key in cached:
+                results.append(dict(cached[key]))
+            else:
+                result = next(fresh)
+                results.append(result)
+                if any(str(value).strip() for value in result.values()):
+                    to_store[key] = result
+        
+        try:
+            self.cache.set_many(to_store)
         except Exception as e:
-            error_msg = f"Error during extraction (attempt {retry_count + 1}/{self.max_retries}): {str(e)}"
-            print(error_msg)
+            logger.warning("Could not write to cache: %s", e)
+        
+        return results
+    
+    async def _stream_content_async(self, request: Dict, record_callback) -> str:
+        """
+        Stream a chat completion and report records as they complete
+        
+        Args:
+            request: Keyword arguments from _build_request
+            record_callback: Callback function(records_completed)
             
-            # Retry logic with exponential backoff
-            if retry_count < self.max_retries - 1:
-                wait_time = 2 ** retry_count  # 1s, 2s, 4s
-                print(f"   Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-                return self.extract_features(notes, retry_count + 1)
+        Returns:
+            Full response content
+        """
+        counter = StreamingRecordCounter()
+        parts = []
+        
+        stream = self._get_async_client().chat.completions.acreate(**request, stream=True)
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
             
-            # All retries exhausted
-            print(f"❌ All {self.max_retries} retry attempts failed")
-            import traceback
-            traceback.print_exc()
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                completed = counter.count
+                if counter.feed(delta) > completed:
+                    record_callback(counter.count)
+        
+        return "".join(parts)
+    
+    def _backoff_delay(self, retry_count: int) -> float:
+        """
+        Exponential backoff with jitter, so concurrent retries don't fire in lockstep
+        
+        Args:
+            retry_count: Current retry attempt (0-based)
             
-            # Return empty structures as fallback
-            return self._get_empty_structures(len(notes))
+        Returns:
+            Seconds to wait before the next attempt (1s, 2s, 4s... plus up to 1s,
+            capped at MAX_BACKOFF_SECONDS)
+        """
+        return min(2 ** retry_count + random.uniform(0, 1), MAX_BACKOFF_SECONDS)
+    
+    @staticmethod
+    def _has_running_loop() -> bool:
+        """Check whether an asyncio event loop is running in the current thread"""
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+    
+    def _get_async_client(self) -> AsyncFireworks:
+        """
+        Get the AsyncFireworks client for the running event loop
+        
+        Requests within one event loop share a single client (and its
+        connection pool); a new loop, e.g. a later asyncio.run, gets a new one.
+        Loops running concurrently in different threads each keep their own.
+        
+        Returns:
+            AsyncFireworks client bound to the current event loop
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            try:
+                client = AsyncFireworks(**self._client_options)
+            except Exception as e:
+                raise ConnectionError(f"Failed to initialize Fireworks async client: {str(e)}")
+            self._async_clients[loop] = client
+        return client
+    
+    def _estimate_output_tokens(self, note: str) -> int:
+        """Output budget for one note: the per-note floor, or enough to copy a long note back (~3 chars/token)"""
+        return max(self.per_note_token_budget, len(note) // 3)
+    
+    def _pack_batches(self, notes: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+        """
+        Group consecutive notes into requests sized by estimated tokens
+        
+        A batch is closed once it holds batch_size notes, or when the next note
+        would push it past max_batch_tokens of input or past what fits in
+        MAX_OUTPUT_TOKENS of output; a single oversized note still gets its own batch.
+        
+        Args:
+            notes: Clinical notes, in order
+            batch_size: Maximum number of notes per batch
+            
+        Yields:
+            Lists of consecutive notes
+        """
+        output_limit = MAX_OUTPUT_TOKENS - _OUTPUT_TOKEN_OVERHEAD
+        batch = []
+        input_tokens = output_tokens = 0
+        
+        for note in notes:
+            note_input = len(note) // 4
+            note_output = self._estimate_output_tokens(note)
+            if batch and (
+                len(batch) >= batch_size
+                or input_tokens + note_input > self.max_batch_tokens
+                or output_tokens + note_output > output_limit
+            ):
+                yield batch
+                batch = []
+                input_tokens = output_tokens = 0
+            batch.append(note)
+            input_tokens += note_input
+            output_tokens += note_output
+        
+        if batch:
+            yield batch
+    
+    async def _close_async_client(self):
+        """Close the running loop's AsyncFireworks client, releasing its pooled connections"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning("Failed to close async client: %s", e)
+    
+    def _build_request(self, notes: List[str]) -> Dict:
+        """
+        Build the chat completion arguments for a batch of notes
+        
+        Args:
+            notes: List of clinical note strings
+            
+        Returns:
+            Keyword arguments for chat.completions.create
+        """
+        # Validate input
+        if not notes or len(notes) == 0:
+            raise ValueError("Notes list cannot be empty")
+        
+        # Create the user prompt
+        user_prompt = get_user_prompt(notes)
+        
+        output_tokens = sum(self._estimate_output_tokens(note) for note in notes)
+        max_tokens = min(MAX_OUTPUT_TOKENS, output_tokens + _OUTPUT_TOKEN_OVERHEAD)
+        
+        return {
+            "model": self.model,
+            "messages": [
+                _SYSTEM_MESSAGE,
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": self.temperature,
+            "max_tokens": max_tokens,
+            "response_format": {"type": "json_object", "schema": _OUTPUT_SCHEMA}
+        }
+    
+    def _handle_response(self, response) -> List[Dict]:
+        """
+        Validate and parse an API response into structured dictionaries
+        
+        Args:
+            response: Chat completion response from Fireworks AI
+            
+        Returns:
+            List of structured dictionaries
+        """
+        return self._handle_content(self._response_content(response))
+    
+    def _response_content(self, response) -> str:
+        """Validate an API response and return its message content"""
+        if not response or not response.choices:
+            raise ValueError("Empty response from API")
+        
+        return response.choices[0].message.content
+    
+    async def _handle_content_async(self, content: str) -> List[Dict]:
+        """
+        Parse response content without stalling the event loop
+        
+        Typical responses parse in well under a millisecond and are handled
+        inline; only unusually long content is sent to the default executor,
+        where a slow fallback scan cannot hold up other requests' I/O.
+        
+        Args:
+            content: Raw message content from the API
+            
+        Returns:
+            List of structured dictionaries
+        """
+        if content and len(content) > _OFFLOAD_PARSE_CHARS:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._handle_content, content)
+        return self._handle_content(content)
+    
+    def _handle_content(self, content: str) -> List[Dict]:
+        """
+        Validate and parse response content into structured dictionaries
+        
+        Args:
+            content: Raw message content from the API
+            
+        Returns:
+            List of structured dictionaries
+        """
+        if not content or not content.strip():
+            raise ValueError("Empty content in API response")
+        
+        # Schema-constrained output validates directly; anything else goes through the lenient parser
+        try:
+            return [
+                record.model_dump()
+                for record in _ExtractionOutput.model_validate_json(content).results
+            ]
+        except ValidationError:
+            pass
+        
+        # Parse JSON response
+        structured_data = self._parse_response(content)
+        
+        # Validate parsed data
+        if not structured_data:
+            raise ValueError("Failed to parse response into structured data")
+        
+        return [self._expand_keys(record) if isinstance(record, dict) else record for record in structured_data]
+    
+    def _expand_keys(self, record: Dict) -> Dict:
+        """Map the short output keys of one record back to full field names"""
+        return {FIELD_ALIASES.get(key, key): value for key, value in record.items()}
+    
+    def _align_results(self, structured_data: List[Dict], notes: List[str]) -> List[Dict]:
+        """
+        Pad or truncate parsed results to exactly one structure per note
+        
+        Args:
+            structured_data: Parsed structured dictionaries
+            notes: List of clinical notes sent in the request
+            
+        Returns:
+            List of structured dictionaries aligned with notes
+        """
+        # Handle length mismatch
+        if len(structured_data) != len(notes):
+            logger.warning("Expected %d results, got %d", len(notes), len(structured_data))
+            
+            # If too few, pad with empty structures
+            if len(structured_data) < len(notes):
+                logger.warning("Padding %d missing records", len(notes) - len(structured_data))
+                while len(structured_data) < len(notes):
+                    structured_data.append(self._get_empty_structure())
+            
+            # If too many, truncate
+            elif len(structured_data) > len(notes):
+                logger.warning("Truncating %d extra records", len(structured_data) - len(notes))
+                structured_data = structured_data[:len(notes)]
+        
+        return structured_data
     
     def _parse_response(self, content: str) -> List[Dict]:
         """
@@ -151,89 +823,116 @@ class ClinicalNotesExtractor:
             content = self._clean_markdown(content)
             
             # Try to parse directly
-            data = json.loads(content)
+            data = orjson.loads(content)
             
             # Handle different response formats
             if isinstance(data, list):
                 return data
             elif isinstance(data, dict):
-                # Check for common wrapper keys
-                if 'results' in data:
-                    return data['results']
-                elif 'features' in data:
-                    return data['features']
-                elif 'data' in data:
-                    return data['data']
-                elif 'notes' in data:
-                    return data['notes']
-                elif 'extracted_features' in data:
-                    return data['extracted_features']
-                else:
-                    # Check if it's a single structured object
-                    if self._is_valid_structure(data):
-                        return [data]
-                    else:
-                        # Try to find any list value
-                        for key, value in data.items():
-                            if isinstance(value, list):
-                                return value
-                        # Single object, wrap in list
-                        return [data]
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            print(f"Content preview: {content[:200]}...")
-            
-            # Try regex extraction as fallback
-            return self._extract_json_with_regex(content)
+                # Check for common wrapper keys, "results" (the requested shape) first
+                for key in _WRAPPER_KEYS:
+                    value = data.get(key)
+                    if isinstance(value, list):
+                        return value
+                
+                # Check if it's a single structured object
+                if self._is_valid_structure(data):
+                    return [data]
+                
+                # Try to find any list value
+                for value in data.values():
+                    if isinstance(value, list):
+                        return value
+                # Single object, wrap in list
+                return [data]
+            
+        except orjson.JSONDecodeError as e:
+            logger.warning("JSON decode error: %s", e)
+            logger.debug("Content preview: %s...", content[:200])
+            
+            # Retry once without trailing commas; the repaired text has none left
+            repaired = _TRAILING_COMMA.sub(r"\1", content)
+            if repaired != content:
+                return self._parse_response(repaired)
+            
+            # Fall back to scanning for JSON embedded in the text
+            return self._extract_embedded_json(content)
         
         except Exception as e:
-            print(f"Unexpected error in parse_response: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Unexpected error in parse_response: %s", e)
         
         return []
     
     def _clean_markdown(self, content: str) -> str:
         """Remove markdown code blocks from content"""
-        if content.startswith("```json"):
-            content = content[7:]
-        elif content.startswith("```"):
-            content = content[3:]
+        return _CODE_FENCE.sub("", content).strip()
+    
+    def _extract_embedded_json(self, content: str) -> List[Dict]:
+        """
+        Fallback: decode the first JSON array or object embedded in the content
+        
+        Each '[' / '{' is tried in turn with raw_decode, which stops at the end
+        of the value, so trailing prose is ignored and nothing backtracks. If no
+        complete value is found (e.g. output cut off at max_tokens), the records
+        that did arrive in full are salvaged from the first array.
+        """
+        for attempt, match in enumerate(_JSON_START.finditer(content)):
+            # Every failed attempt may scan to the end; bound the total work
+            if attempt >= _MAX_JSON_CANDIDATES:
+                break
+            try:
+                obj, _ = _DECODER.raw_decode(content, match.start())
+            except ValueError:
+                continue
+            
+            if isinstance(obj, list):
+                # Skip bracketed prose such as "[1]" or "[see note]"
+                if all(isinstance(item, dict) for item in obj):
+                    return obj
+            elif isinstance(obj, dict):
+                # Try to extract list from the object
+                for key, value in obj.items():
+                    if isinstance(value, list):
+                        return value
+                return [obj]
         
-        if content.endswith("```"):
-            content = content[:-3]
+        records = self._salvage_records(content)
+        if records:
+            logger.warning("Response JSON incomplete, recovered %d complete record(s)", len(records))
+            return records
         
-        return content.strip()
+        logger.warning("Failed to find embedded JSON in response")
+        return []
     
-    def _extract_json_with_regex(self, content: str) -> List[Dict]:
-        """Fallback: Extract JSON using regex"""
-        # Try to extract JSON array
-        json_match = re.search(r'$$.*$$', content, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group())
-            except Exception as parse_error:
-                print(f"Failed to parse extracted array: {parse_error}")
+    def _salvage_records(self, content: str) -> List[Dict]:
+        """
+        Decode the complete objects at the start of a truncated JSON array
         
-        # Try to extract JSON object
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-        if json_match:
+        Args:
+            content: Response text whose JSON does not parse as a whole
+            
+        Returns:
+            Objects decoded before the first incomplete one (possibly empty)
+        """
+        records = []
+        pos = content.find("[")
+        if pos == -1:
+            return records
+        pos += 1
+        
+        while True:
+            # Skip separators between array items
+            while pos < len(content) and content[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(content) or content[pos] != "{":
+                break
             try:
-                obj = json.loads(json_match.group())
-                if isinstance(obj, dict):
-                    # Try to extract list from the object
-                    for key, value in obj.items():
-                        if isinstance(value, list):
-                            return value
-                    # Check if it's a valid structure
-                    if self._is_valid_structure(obj):
-                        return [obj]
-                return [obj] if isinstance(obj, dict) else obj
-            except Exception as parse_error:
-                print(f"Failed to parse extracted object: {parse_error}")
+                obj, pos = _DECODER.raw_decode(content, pos)
+            except ValueError:
+                break
+            records.append(obj)
         
-        return []
+        return records
     
     def _is_valid_structure(self, obj: Dict) -> bool:
         """
@@ -245,16 +944,13 @@ class ClinicalNotesExtractor:
         Returns:
             Boolean indicating if it's a valid structure
         """
-        # Updated to match new clinical note structure
-        expected_fields = {
-            "Chief_Complaint", "History_Present_Illness", "Past_Medical_History",
-            "Current_Medications", "Allergies", "Physical_Exam",
-            "Review_of_Systems", "Labs_Imaging_Results", 
-            "Assessment_Impression", "Plan"
-        }
-        obj_fields = set(obj.keys())
-        # Check if at least half of expected fields are present
-        return len(expected_fields.intersection(obj_fields)) >= len(expected_fields) // 2
+        found = 0
+        for field in obj:
+            if field in _EXPECTED:
+                found += 1
+                if found >= _THRESHOLD:
+                    return True
+        return False
     
     def _get_empty_structure(self) -> Dict:
         """
@@ -263,19 +959,7 @@ class ClinicalNotesExtractor:
         Returns:
             Empty structured dictionary
         """
-        # Updated to match new clinical note structure
-        return {
-            "Chief_Complaint": "",
-            "History_Present_Illness": "",
-            "Past_Medical_History": "",
-            "Current_Medications": "",
-            "Allergies": "",
-            "Physical_Exam": "",
-            "Review_of_Systems": "",
-            "Labs_Imaging_Results": "",
-            "Assessment_Impression": "",
-            "Plan": ""
-        }
+        return _EMPTY_TEMPLATE.copy()
     
     def _get_empty_structures(self, count: int) -> List[Dict]:
         """
@@ -287,83 +971,409 @@ class ClinicalNotesExtractor:
         Returns:
             List of empty structured dictionaries
         """
-        return [self._get_empty_structure() for _ in range(count)]
+        return [_EMPTY_TEMPLATE.copy() for _ in range(count)]
+    
+    def _get_empty_structures_ro(self, count: int) -> List[Mapping[str, str]]:
+        """
+        Read-only variant of _get_empty_structures for results that get copied later
+        
+        Every entry is the same read-only view of the template, so nothing is
+        allocated per note. Only use it where results pass through
+        _expand_results, which copies each entry before returning it.
+        
+        Args:
+            count: Number of empty structures needed
+            
+        Returns:
+            List of count references to one read-only empty structure
+        """
+        return [_EMPTY_FROZEN] * count
     
     def extract_batch(
         self, 
-        notes: List[str], 
+        notes: Iterable[str], 
         batch_size: int = 5,
         progress_callback=None,
-        rate_limit_delay: float = 0.5
+        rate_limit_delay: float = 0,
+        max_concurrency: int = 5
     ) -> List[Dict]:
         """
         Extract features in batches with progress tracking
         
+        Batches are sent concurrently (see extract_batch_async) when
+        max_concurrency > 1; if an event loop is already running in this
+        thread (e.g. Jupyter) a thread pool over the sync client is used
+        instead. With max_concurrency 1 they run one after another and
+        notes may be any iterable, e.g. a generator from iter_excel_notes.
+        
+        With a cache configured, each batch's results are committed to it as
+        soon as the batch completes, so re-running an interrupted job resumes:
+        finished notes come from the cache and only the rest are sent.
+        
         Args:
-            notes: List of all clinical notes
-            batch_size: Number of notes per batch
-            progress_callback: Optional callback function(current, total, message)
-            rate_limit_delay: Delay between batches in seconds
+            notes: Clinical notes (list or any iterable of strings)
+            batch_size: Maximum number of notes per batch
+            progress_callback: Optional callback function(notes_done, total_notes, message);
+                total_notes is None when notes has no known length
+            rate_limit_delay: Optional minimum delay between request starts in seconds;
+                0 (the default) sends requests back to back, failures still back off
+            max_concurrency: Maximum number of concurrent API requests
             
         Returns:
             List of all structured features
         """
+        if max_concurrency > 1:
+            notes = notes if isinstance(notes, list) else list(notes)
+            if self._has_running_loop():
+                return self._extract_batch_threaded(
+                    notes, batch_size, progress_callback, max_concurrency, rate_limit_delay
+                )
+            return asyncio.run(self.extract_batch_async(
+                notes,
+                batch_size=batch_size,
+                max_concurrency=max_concurrency,
+                progress_callback=progress_callback,
+                requests_per_second=1 / rate_limit_delay if rate_limit_delay > 0 else None
+            ))
+        
         all_results = []
-        total_batches = (len(notes) + batch_size - 1) // batch_size
         failed_batches = []
+        batch_number = 0
         
-        for i in range(0, len(notes), batch_size):
-            batch = notes[i:i + batch_size]
-            batch_number = i // batch_size + 1
+        # A lazy iterable is sent as is; a list can be filtered and deduplicated first
+        original_notes = notes if isinstance(notes, list) else None
+        if original_notes is not None:
+            notes, positions = self._unique_notes(original_notes)
+        
+        batches = self.extract_batch_iter(notes, batch_size, rate_limit_delay, failed_batches)
+        for batch_number, (done, total, results) in enumerate(batches, 1):
+            all_results.extend(results)
             
             # Progress update
-            message = f"Processing batch {batch_number}/{total_batches} ({len(batch)} notes)"
-            print(message)
-            
             if progress_callback:
-                progress_callback(batch_number, total_batches, message)
+                if total is None:
+                    message = f"Processed batch {batch_number} ({done} notes)"
+                else:
+                    message = f"Processed batch {batch_number} ({done}/{total} notes)"
+                progress_callback(done, total, message)
+        
+        self._log_batch_summary(batch_number, failed_batches)
+        
+        if original_notes is not None:
+            return self._expand_results(all_results, positions)
+        return all_results
+    
+    def _extract_batch_threaded(
+        self, 
+        notes: List[str], 
+        batch_size: int, 
+        progress_callback=None, 
+        max_concurrency: int = 5,
+        rate_limit_delay: float = 0
+    ) -> List[Dict]:
+        """
+        Extract batches on a thread pool with the sync client
+        
+        Used when asyncio.run is unavailable because a loop is already running;
+        the Fireworks client is thread-safe and threads wait on sockets, not the GIL.
+        
+        Args:
+            notes: List of all clinical notes
+            batch_size: Maximum number of notes per batch
+            progress_callback: Optional callback function(notes_done, total_notes, message)
+            max_concurrency: Number of worker threads
+            rate_limit_delay: Optional minimum delay between API request starts in seconds, shared by
+                all threads; 0 (the default) builds no limiter
+            
+        Returns:
+            List of all structured features, in the same order as notes
+        """
+        unique, positions = self._unique_notes(notes)
+        batches = list(self._pack_batches(unique, batch_size))
+        results = [None] * len(batches)
+        failed_batches = []
+        notes_done = 0
+        rate_limiter = RateLimiter(1 / rate_limit_delay) if rate_limit_delay > 0 else None
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {
+                executor.submit(self.extract_features, batch, rate_limiter): index
+                for index, batch in enumerate(batches)
+            }
+            
+            for completed, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                batch = batches[index]
+                try:
+                    results[index] = self._fit_batch_results(future.result(), batch, index + 1, failed_batches)
+                except Exception as e:
+                    logger.error("Error processing batch %d: %s", index + 1, e)
+                    results[index] = self._get_empty_structures_ro(len(batch))
+                    failed_batches.append(index + 1)
+                
+                notes_done += len(batch)
+                if progress_callback:
+                    progress_callback(
+                        notes_done, len(unique),
+                        f"Processed batch {completed}/{len(batches)} ({notes_done}/{len(unique)} notes)"
+                    )
+        
+        self._log_batch_summary(len(batches), sorted(failed_batches))
+        
+        return self._expand_results([result for batch_results in results for result in batch_results], positions)
+    
+    def extract_batch_iter(
+        self, 
+        notes: Iterable[str], 
+        batch_size: int = 5,
+        rate_limit_delay: float = 0,
+        failed_batches: Optional[List[int]] = None
+    ) -> Iterator[Tuple[int, Optional[int], List[Dict]]]:
+        """
+        Extract features batch by batch, yielding results as each batch completes
+        
+        Notes are pulled lazily and packed into batches (see _pack_batches), so a
+        generator is never materialized in full. Stopping iteration early (e.g. on user cancel)
+        skips the remaining batches.
+        
+        Args:
+            notes: Clinical notes (list or any iterable of strings)
+            batch_size: Maximum number of notes per batch
+            rate_limit_delay: Optional minimum delay between batch request starts in seconds;
+                0 (the default) starts each batch as soon as the previous one returns
+            failed_batches: Optional list collecting numbers of failed batches
+            
+        Yields:
+            Tuple of (notes processed so far, total notes or None if unknown,
+            structured features for the batch)
+        """
+        if failed_batches is None:
+            failed_batches = []
+        total = len(notes) if hasattr(notes, "__len__") else None
+        
+        # Sized inputs are packed up front so the batch count is known
+        batches = self._pack_batches(notes, batch_size)
+        if total is not None:
+            batches = list(batches)
+        total_batches = len(batches) if total is not None else None
+        
+        done = 0
+        last_start = None
+        
+        for batch_number, batch in enumerate(batches, 1):
+            # Opt-in rate limiting: space batch starts, so time spent on the request itself counts
+            if rate_limit_delay > 0 and last_start is not None:
+                remaining = rate_limit_delay - (time.monotonic() - last_start)
+                if remaining > 0:
+                    time.sleep(remaining)
+            last_start = time.monotonic()
+            
+            if total_batches is None:
+                logger.info("Processing batch %d (%d notes)", batch_number, len(batch))
+            else:
+                logger.info("Processing batch %d/%d (%d notes)", batch_number, total_batches, len(batch))
             
             try:
                 # Extract features for this batch
                 results = self.extract_features(batch)
+                results = self._fit_batch_results(results, batch, batch_number, failed_batches)
+            
+            except Exception as e:
+                logger.exception("Error processing batch %d: %s", batch_number, e)
                 
-                # Validate results
-                if not results or len(results) == 0:
-                    print(f"⚠️ Batch {batch_number} returned no results")
-                    results = self._get_empty_structures(len(batch))
-                    failed_batches.append(batch_number)
+                # Add empty structures for failed batch
+                results = self._get_empty_structures(len(batch))
+                failed_batches.append(batch_number)
+            
+            done += len(batch)
+            yield done, total, results
+    
+    async def extract_batch_async(
+        self, 
+        notes: List[str], 
+        batch_size: int = 5,
+        max_concurrency: int = 20,
+        progress_callback=None,
+        requests_per_second: Optional[float] = None,
+        cancel_event=None
+    ) -> List[Dict]:
+        """
+        Extract features in batches with up to max_concurrency requests in flight
+        
+        Blank notes are not sent and duplicate notes are sent once. Notes are
+        queued and max_concurrency workers each take the next
+        batch_size notes as soon as their previous request returns, so a slow
+        batch only holds up its own worker instead of a fixed batch schedule.
+        
+        Args:
+            notes: List of all clinical notes
+            batch_size: Maximum number of notes per batch
+            max_concurrency: Maximum number of concurrent API requests
+            progress_callback: Optional callback function(notes_done, total_notes, message),
+                called as records stream in and as each batch completes
+            requests_per_second: Optional cap on how fast batch requests are started
+            cancel_event: Optional threading.Event; once set, notes not yet dispatched are skipped
+            
+        Returns:
+            List of all structured features, in the same order as notes
+        """
+        original_count = len(notes)
+        notes, positions = self._unique_notes(notes)
+        if len(notes) < original_count:
+            logger.info("Sending %d unique non-empty notes out of %d", len(notes), original_count)
+        
+        batches = list(self._pack_batches(notes, batch_size))
+        total_batches = len(batches)
+        failed_batches = []
+        completed = 0
+        dispatched = 0
+        rate_limiter = AsyncRateLimiter(requests_per_second) if requests_per_second else None
+        
+        # Workers pull the next batch as soon as their previous request finishes
+        queue = asyncio.Queue()
+        start = 0
+        for batch in batches:
+            queue.put_nowait((start, batch))
+            start += len(batch)
+        
+        results = [None] * len(notes)
+        worker_count = max(1, min(max_concurrency, total_batches))
+        notes_done = 0
+        streamed = [0] * worker_count
+        
+        def _report(message: str):
+            if progress_callback:
+                progress_callback(notes_done + sum(streamed), len(notes), message)
+        
+        async def _worker(worker_index: int):
+            nonlocal completed, dispatched, notes_done
+            
+            while not queue.empty():
+                if cancel_event is not None and cancel_event.is_set():
+                    return
                 
-                elif len(results) != len(batch):
-                    print(f"⚠️ Batch {batch_number} count mismatch: expected {len(batch)}, got {len(results)}")
-                    # Pad or truncate
-                    if len(results) < len(batch):
-                        results.extend(self._get_empty_structures(len(batch) - len(results)))
-                    else:
-                        results = results[:len(batch)]
-                    
+                start, batch = queue.get_nowait()
+                dispatched += 1
+                batch_number = dispatched
+                
+                def _on_record(count: int):
+                    # Streamed records advance progress per note, not just per batch
+                    streamed[worker_index] = min(max(streamed[worker_index], count), len(batch))
+                    _report(f"Extracted {notes_done + sum(streamed)}/{len(notes)} notes ({completed}/{total_batches} batches done)")
+                
+                try:
+                    batch_results = await self.extract_features_async(
+                        batch,
+                        record_callback=_on_record if progress_callback else None,
+                        rate_limiter=rate_limiter
+                    )
+                    batch_results = self._fit_batch_results(batch_results, batch, batch_number, failed_batches)
+                except Exception as e:
+                    logger.error("Error processing batch %d: %s", batch_number, e)
+                    batch_results = self._get_empty_structures_ro(len(batch))
                     failed_batches.append(batch_number)
                 
-                all_results.extend(results)
+                results[start:start + len(batch)] = batch_results
                 
-                # Rate limiting delay (except for last batch)
-                if i + batch_size < len(notes):
-                    time.sleep(rate_limit_delay)
+                completed += 1
+                streamed[worker_index] = 0
+                notes_done += len(batch)
+                message = f"Processed batch {completed}/{total_batches} ({len(batch)} notes)"
+                logger.info(message)
+                _report(message)
+        
+        try:
+            await asyncio.gather(*[_worker(index) for index in range(worker_count)])
+        finally:
+            await self._close_async_client()
+        
+        # Notes never dispatched (cancelled run) count as failed batches
+        skipped = len(notes) - notes_done
+        if skipped:
+            logger.warning("Extraction cancelled, %d notes not processed", skipped)
+            failed_batches.extend(range(dispatched + 1, total_batches + 1))
+        
+        self._log_batch_summary(total_batches, failed_batches)
+        
+        return self._expand_results(results, positions)
+    
+    def _unique_notes(self, notes: List[str]) -> Tuple[List[str], List[Optional[int]]]:
+        """
+        Drop blank notes and collapse duplicates before sending them to the API
+        
+        Args:
+            notes: List of clinical notes
             
-            except Exception as e:
-                print(f"❌ Error processing batch {batch_number}: {e}")
-                import traceback
-                traceback.print_exc()
-                
-                # Add empty structures for failed batch
-                all_results.extend(self._get_empty_structures(len(batch)))
-                failed_batches.append(batch_number)
+        Returns:
+            Tuple of (unique non-empty notes, position in that list for each
+            original note, or None for blank notes)
+        """
+        unique = {}
+        positions = []
+        for note in notes:
+            if note and note.strip():
+                positions.append(unique.setdefault(note, len(unique)))
+            else:
+                positions.append(None)
+        return list(unique), positions
+    
+    def _expand_results(self, results: List[Optional[Dict]], positions: List[Optional[int]]) -> List[Dict]:
+        """
+        Map results for unique notes back onto the original note order
         
-        # Summary
-        print(f"\n✅ Batch processing complete:")
-        print(f"   Total batches: {total_batches}")
-        print(f"   Successful: {total_batches - len(failed_batches)}")
-        print(f"   Failed: {len(failed_batches)}")
-        if failed_batches:
-            print(f"   Failed batch numbers: {failed_batches}")
+        Args:
+            results: Results for the unique notes (None where nothing came back)
+            positions: Positions returned by _unique_notes
+            
+        Returns:
+            One structured dictionary per original note; blank notes get empty structures
+        """
+        return [
+            dict(results[position]) if position is not None and results[position] is not None
+            else self._get_empty_structure()
+            for position in positions
+        ]
+    
+    def _fit_batch_results(
+        self, 
+        results: List[Dict], 
+        batch: List[str], 
+        batch_number: int, 
+        failed_batches: List[int]
+    ) -> List[Dict]:
+        """
+        Pad or truncate batch results so they align with the batch notes
+        
+        Args:
+            results: Structured features returned for the batch
+            batch: Notes in the batch
+            batch_number: 1-based batch number (for reporting)
+            failed_batches: List collecting numbers of failed batches
+            
+        Returns:
+            List with exactly one structure per note in the batch
+        """
+        # Validate results
+        if not results or len(results) == 0:
+            logger.warning("Batch %d returned no results", batch_number)
+            failed_batches.append(batch_number)
+            return self._get_empty_structures(len(batch))
         
-        return all_results
\ No newline at end of file
+        if len(results) != len(batch):
+            logger.warning("Batch %d count mismatch: expected %d, got %d", batch_number, len(batch), len(results))
+            failed_batches.append(batch_number)
+            # Pad or truncate
+            if len(results) < len(batch):
+                return results + self._get_empty_structures(len(batch) - len(results))
+            return results[:len(batch)]
+        
+        return results
+    
+    def _log_batch_summary(self, total_batches: int, failed_batches: List[int]):
+        """Log a summary of batch processing results"""
+        logger.info(
+            "Batch processing complete: %d total, %d successful, %d failed",
+            total_batches, total_batches - len(failed_batches), len(failed_batches)
+        )
+        if failed_batches:
+            logger.warning("Failed batch numbers: %s", failed_batches)
\ No newline at end of file
@@ -3,6 +3,25 @@ Clinical NLP Extraction Prompts
 Optimized for structured medical information extraction from clinical notes
 """
 
+import math
+import re
+from collections import Counter
+
+# Short output keys the model is asked to use, mapped to the full field names.
+# Shorter keys cut the output tokens spent repeating field names for every note.
+FIELD_ALIASES = {
+    "cc": "Chief_Complaint",
+    "hpi": "History_Present_Illness",
+    "pmh": "Past_Medical_History",
+    "meds": "Current_Medications",
+    "allergies": "Allergies",
+    "pe": "Physical_Exam",
+    "ros": "Review_of_Systems",
+    "labs": "Labs_Imaging_Results",
+    "assessment": "Assessment_Impression",
+    "plan": "Plan"
+}
+
 SYSTEM_PROMPT = """You are an expert clinical NLP system specialized in extracting structured medical information from clinical documentation. Your task is to analyze clinical notes and extract key medical data into a standardized JSON format.
 
 ## CORE PRINCIPLES
@@ -14,68 +33,68 @@ SYSTEM_PROMPT = """You are an expert clinical NLP system specialized in extracti
 
 ## FIELD DEFINITIONS & EXTRACTION GUIDELINES
 
-### 1. Chief_Complaint (CC)
+### 1. Chief_Complaint (CC) → key "cc"
 **Definition:** The primary reason for the patient's visit, ideally in the patient's own words.
 **What to extract:** Main symptom or concern that brought the patient to seek care
 **Examples:** "Chest pain", "Shortness of breath", "Headache for 3 days"
 **Look for:** Phrases like "CC:", "Chief Complaint:", "Presenting complaint:", "Patient states", or opening statements
 
-### 2. History_Present_Illness (HPI)
+### 2. History_Present_Illness (HPI) → key "hpi"
 **Definition:** Detailed narrative of the current illness using OLD CARTS framework (Onset, Location, Duration, Character, Aggravating/Alleviating factors, Radiation, Severity)
 **What to extract:** Complete description of symptom progression, timeline, quality, and modifying factors
 **Examples:** "65yo male with sudden onset crushing substernal chest pain x 2 hours, radiating to left arm, 8/10 severity, worse with exertion"
 **Look for:** Sections labeled "HPI:", detailed symptom descriptions, timeline narratives
 
-### 3. Past_Medical_History (PMH)
+### 3. Past_Medical_History (PMH) → key "pmh"
 **Definition:** Patient's prior medical conditions, surgeries, hospitalizations, and chronic diseases
 **What to extract:** All documented previous diagnoses, procedures, and significant past medical events
 **Format:** Separate multiple items with semicolon
 **Examples:** "Diabetes Type 2; Hypertension; Appendectomy 2015; Prior MI 2020"
 **Look for:** "PMH:", "Past Medical History:", "History of", mentions of chronic conditions
 
-### 4. Current_Medications
+### 4. Current_Medications → key "meds"
 **Definition:** All medications the patient is currently taking
 **What to extract:** Drug name, dose, route, frequency - preserve as documented
 **Format:** Separate each medication with semicolon
 **Examples:** "Metformin 500mg PO BID; Lisinopril 10mg PO daily; Aspirin 81mg PO daily"
 **Look for:** "Medications:", "Current meds:", "Taking:", drug lists with dosing
 
-### 5. Allergies
+### 5. Allergies → key "allergies"
 **Definition:** Known allergies (drug, food, environmental) and their reactions
 **What to extract:** Allergen and reaction type if documented
 **Format:** Separate multiple allergies with semicolon; use hyphen to separate allergen from reaction
 **Examples:** "Penicillin - Anaphylaxis; Sulfa drugs - Rash; NKDA" (No Known Drug Allergies)
 **Look for:** "Allergies:", "NKDA", "NKA", allergen lists with reactions
 
-### 6. Physical_Exam (PE)
+### 6. Physical_Exam (PE) → key "pe"
 **Definition:** Objective clinical findings from physician's physical examination
 **What to extract:** Vital signs and examination findings organized by body system
 **Format:** Can include system-by-system findings
 **Examples:** "BP 140/90, HR 88, RR 16, Temp 37°C; CV: RRR, no murmurs; Lungs: Clear to auscultation bilaterally; Abd: Soft, non-tender"
 **Look for:** "PE:", "Physical Exam:", "Examination:", vital signs, system reviews (CV, Resp, Abd, Neuro, etc.)
 
-### 7. Review_of_Systems (ROS)
+### 7. Review_of_Systems (ROS) → key "ros"
 **Definition:** Systematic inventory of symptoms obtained through questioning, organized by organ system
 **What to extract:** Positive and pertinent negative findings across body systems
 **Format:** Group by system when possible
 **Examples:** "General: No fever, fatigue, or weight loss; CV: No chest pain or palpitations; Resp: No cough or dyspnea; GI: Nausea present, no vomiting"
 **Look for:** "ROS:", "Review of Systems:", systematic symptom queries by organ system
 
-### 8. Labs_Imaging_Results
+### 8. Labs_Imaging_Results → key "labs"
 **Definition:** Diagnostic test results including laboratory values, imaging findings, and interpretations
 **What to extract:** Test name, values, units, and clinical interpretation if provided
 **Format:** Include test type and key findings; separate multiple tests with semicolon
 **Examples:** "CBC: WBC 15.2 (elevated), Hgb 12.1; CXR: Right lower lobe infiltrate consistent with pneumonia; Troponin: 0.02 (normal)"
 **Look for:** Lab values, imaging reports, test results with interpretations, "Labs:", "Imaging:", specific test names
 
-### 9. Assessment_Impression
+### 9. Assessment_Impression → key "assessment"
 **Definition:** Physician's working diagnosis or differential diagnoses
 **What to extract:** Primary diagnosis and/or list of possible conditions being considered
 **Format:** List primary diagnosis first; separate differential diagnoses with semicolon
 **Examples:** "Acute STEMI; Rule out pericarditis", "Community-acquired pneumonia", "UTI vs Pyelonephritis"
 **Look for:** "Assessment:", "Impression:", "Diagnosis:", "DDx:", diagnostic statements
 
-### 10. Plan
+### 10. Plan → key "plan"
 **Definition:** Proposed treatment plan, follow-up care, and patient instructions
 **What to extract:** Medications prescribed, procedures ordered, follow-up appointments, patient education, consultations
 **Format:** Comprehensive treatment and management plan
@@ -84,28 +103,28 @@ SYSTEM_PROMPT = """You are an expert clinical NLP system specialized in extracti
 
 ## OUTPUT FORMAT SPECIFICATION
 
-Return a JSON object with this exact structure:
+Return a JSON object with this exact structure, using the short key given for each field above:
 
 {
   "results": [
     {
-      "Chief_Complaint": "",
-      "History_Present_Illness": "",
-      "Past_Medical_History": "",
-      "Current_Medications": "",
-      "Allergies": "",
-      "Physical_Exam": "",
-      "Review_of_Systems": "",
-      "Labs_Imaging_Results": "",
-      "Assessment_Impression": "",
-      "Plan": ""
+      "cc": "",
+      "hpi": "",
+      "pmh": "",
+      "meds": "",
+      "allergies": "",
+      "pe": "",
+      "ros": "",
+      "labs": "",
+      "assessment": "",
+      "plan": ""
     }
   ]
 }
 
 ## CRITICAL RULES
 1. **JSON ONLY:** Return ONLY valid JSON - no markdown code blocks, no explanations, no additional text
-2. **Field Names:** Use exact field names as specified (case-sensitive)
+2. **Keys:** Use exactly the short keys shown in the output format (case-sensitive)
 3. **Empty Values:** Use empty string "" for any field not present in the note
 4. **Multiple Items:** Separate with semicolon (;) within the same field
 5. **Order Preservation:** Maintain the order of notes as provided in the input
@@ -113,88 +132,6 @@ Return a JSON object with this exact structure:
 7. **Preserve Medical Language:** Keep medical abbreviations, terminology, and formatting as written
 8. **No Hallucination:** Extract only information explicitly stated in the note - do not infer or add information
 
-## COMPREHENSIVE EXAMPLES
-
-### Example 1: Complete Emergency Department Note
-**Input:**
-"CC: Chest pain. HPI: 65-year-old male with no significant PMH presents with sudden onset of crushing substernal chest pain that started 2 hours ago while mowing the lawn. Pain is 9/10 in severity, radiating to left arm and jaw. Associated with diaphoresis and nausea. Relieved slightly by rest. Denies prior episodes. PMH: Hypertension, Type 2 Diabetes Mellitus, Hyperlipidemia. Medications: Metformin 1000mg PO BID, Lisinopril 20mg PO daily, Atorvastatin 40mg PO QHS. Allergies: Penicillin - anaphylaxis; Sulfa - rash. PE: Vitals - BP 165/95, HR 105, RR 20, O2 sat 94% on RA, Temp 37.1°C. General: Anxious, diaphoretic. CV: Tachycardic, regular rhythm, no murmurs. Lungs: Clear bilaterally. ROS: CV: Chest pain as above, no palpitations; Resp: No dyspnea at rest, no cough; GI: Nausea, no vomiting. Labs: Troponin I 2.8 ng/mL (elevated), ECG shows ST elevation in leads II, III, aVF. Assessment: Acute inferior STEMI. Plan: Aspirin 325mg PO stat given, Plavix 600mg PO stat, Heparin bolus and drip initiated, Activate cath lab for emergent PCI, Cardiology consulted, Admit to CCU, NPO, Serial troponins."
-
-**Output:**
-{
-  "results": [{
-    "Chief_Complaint": "Chest pain",
-    "History_Present_Illness": "65-year-old male with sudden onset of crushing substernal chest pain that started 2 hours ago while mowing the lawn. Pain is 9/10 in severity, radiating to left arm and jaw. Associated with diaphoresis and nausea. Relieved slightly by rest. Denies prior episodes",
-    "Past_Medical_History": "Hypertension; Type 2 Diabetes Mellitus; Hyperlipidemia",
-    "Current_Medications": "Metformin 1000mg PO BID; Lisinopril 20mg PO daily; Atorvastatin 40mg PO QHS",
-    "Allergies": "Penicillin - anaphylaxis; Sulfa - rash",
-    "Physical_Exam": "BP 165/95, HR 105, RR 20, O2 sat 94% on RA, Temp 37.1°C; General: Anxious, diaphoretic; CV: Tachycardic, regular rhythm, no murmurs; Lungs: Clear bilaterally",
-    "Review_of_Systems": "CV: Chest pain as above, no palpitations; Resp: No dyspnea at rest, no cough; GI: Nausea, no vomiting",
-    "Labs_Imaging_Results": "Troponin I 2.8 ng/mL (elevated); ECG shows ST elevation in leads II, III, aVF",
-    "Assessment_Impression": "Acute inferior STEMI",
-    "Plan": "Aspirin 325mg PO stat given; Plavix 600mg PO stat; Heparin bolus and drip initiated; Activate cath lab for emergent PCI; Cardiology consulted; Admit to CCU; NPO; Serial troponins"
-  }]
-}
-
-### Example 2: Brief Progress Note
-**Input:**
-"Patient continues to have shortness of breath. COPD exacerbation. Currently on albuterol and ipratropium nebs q4h. Will add prednisone 40mg daily x 5 days. Pulmonology to see."
-
-**Output:**
-{
-  "results": [{
-    "Chief_Complaint": "Shortness of breath",
-    "History_Present_Illness": "Patient continues to have shortness of breath",
-    "Past_Medical_History": "COPD",
-    "Current_Medications": "Albuterol nebs q4h; Ipratropium nebs q4h",
-    "Allergies": "",
-    "Physical_Exam": "",
-    "Review_of_Systems": "",
-    "Labs_Imaging_Results": "",
-    "Assessment_Impression": "COPD exacerbation",
-    "Plan": "Add prednisone 40mg daily x 5 days; Pulmonology to see"
-  }]
-}
-
-### Example 3: ICU Note with Complex Medications
-**Input:**
-"78F admitted with septic shock secondary to UTI. PMH significant for CKD stage 3, atrial fibrillation. On vancomycin 1g IV q12h, cefepime 2g IV q8h. NKDA. Vitals: BP 95/60 on norepinephrine 0.1mcg/kg/min, HR 88 irregular, Temp 38.5°C. Cultures: Blood cultures pending, urine culture grew E. coli >100K CFU. Assessment: Septic shock improving, urosepsis, AKI on CKD. Plan: Continue broad spectrum antibiotics, wean pressors as tolerated, nephrology following, may need HD if worsens."
-
-**Output:**
-{
-  "results": [{
-    "Chief_Complaint": "",
-    "History_Present_Illness": "",
-    "Past_Medical_History": "CKD stage 3; Atrial fibrillation",
-    "Current_Medications": "Vancomycin 1g IV q12h; Cefepime 2g IV q8h; Norepinephrine 0.1mcg/kg/min",
-    "Allergies": "NKDA",
-    "Physical_Exam": "BP 95/60 on norepinephrine 0.1mcg/kg/min, HR 88 irregular, Temp 38.5°C",
-    "Review_of_Systems": "",
-    "Labs_Imaging_Results": "Blood cultures pending; Urine culture grew E. coli >100K CFU",
-    "Assessment_Impression": "Septic shock improving; Urosepsis; AKI on CKD",
-    "Plan": "Continue broad spectrum antibiotics; Wean pressors as tolerated; Nephrology following; May need HD if worsens"
-  }]
-}
-
-### Example 4: Note Without Explicit Section Headers
-**Input:**
-"Patient came in today complaining of fever and cough for the past 5 days. He has a history of asthma and hypertension. Takes albuterol inhaler as needed and amlodipine 5mg daily. No known allergies. Temperature is 38.9°C, other vitals stable. Lung exam reveals decreased breath sounds in right lower lobe with dullness to percussion. Chest X-ray shows right lower lobe consolidation. Likely community-acquired pneumonia. Starting azithromycin 500mg PO daily for 5 days and close follow-up in 48 hours."
-
-**Output:**
-{
-  "results": [{
-    "Chief_Complaint": "Fever and cough",
-    "History_Present_Illness": "Fever and cough for the past 5 days",
-    "Past_Medical_History": "Asthma; Hypertension",
-    "Current_Medications": "Albuterol inhaler as needed; Amlodipine 5mg daily",
-    "Allergies": "No known allergies",
-    "Physical_Exam": "Temperature 38.9°C, other vitals stable; Lung exam reveals decreased breath sounds in right lower lobe with dullness to percussion",
-    "Review_of_Systems": "",
-    "Labs_Imaging_Results": "Chest X-ray shows right lower lobe consolidation",
-    "Assessment_Impression": "Community-acquired pneumonia",
-    "Plan": "Starting azithromycin 500mg PO daily for 5 days; Close follow-up in 48 hours"
-  }]
-}
-
 ## SPECIAL HANDLING INSTRUCTIONS
 
 ### For ICU/Complex Orders:
@@ -204,7 +141,7 @@ Return a JSON object with this exact structure:
 - Include detailed monitoring plans in Plan section
 
 ### For Order Sets/Medication Lists:
-- When the note is primarily orders (like your first example), categorize appropriately:
+- When the note is primarily orders (as in any order-set examples provided), categorize appropriately:
   - Active treatments → Current_Medications
   - Nutritional orders → Plan
   - DVT prophylaxis, IV fluids → Plan
@@ -221,7 +158,7 @@ Return a JSON object with this exact structure:
 
 ## QUALITY CHECKS BEFORE RETURNING
 - ✓ Valid JSON syntax with no trailing commas
-- ✓ All 10 required fields present in each object
+- ✓ All 10 keys present in each object
 - ✓ Empty strings ("") for missing data, not null or omitted fields
 - ✓ Semicolons properly separating multiple items
 - ✓ Medical abbreviations preserved as written
@@ -231,39 +168,206 @@ Return a JSON object with this exact structure:
 Remember: Your goal is accurate extraction, not interpretation. Extract what is documented, not what might be implied."""
 
 
-def get_user_prompt(notes_list):
+# Worked examples, kept out of SYSTEM_PROMPT; get_user_prompt includes only
+# the ones closest to the notes being sent
+FEW_SHOT_EXAMPLES = [
+    {
+        "title": "Complete Emergency Department Note",
+        "input": (
+            "CC: Chest pain. HPI: 65-year-old male with no significant PMH presents with sudden onset of crushing "
+            "substernal chest pain that started 2 hours ago while mowing the lawn. Pain is 9/10 in severity, "
+            "radiating to left arm and jaw. Associated with diaphoresis and nausea. Relieved slightly by rest. "
+            "Denies prior episodes. PMH: Hypertension, Type 2 Diabetes Mellitus, Hyperlipidemia. Medications: "
+            "Metformin 1000mg PO BID, Lisinopril 20mg PO daily, Atorvastatin 40mg PO QHS. Allergies: Penicillin - "
+            "anaphylaxis; Sulfa - rash. PE: Vitals - BP 165/95, HR 105, RR 20, O2 sat 94% on RA, Temp 37.1°C. "
+            "General: Anxious, diaphoretic. CV: Tachycardic, regular rhythm, no murmurs. Lungs: Clear "
+            "bilaterally. ROS: CV: Chest pain as above, no palpitations; Resp: No dyspnea at rest, no cough; GI: "
+            "Nausea, no vomiting. Labs: Troponin I 2.8 ng/mL (elevated), ECG shows ST elevation in leads II, III, "
+            "aVF. Assessment: Acute inferior STEMI. Plan: Aspirin 325mg PO stat given, Plavix 600mg PO stat, "
+            "Heparin bolus and drip initiated, Activate cath lab for emergent PCI, Cardiology consulted, Admit to "
+            "CCU, NPO, Serial troponins."
+        ),
+        "output": """{
+  "results": [{
+    "cc": "Chest pain",
+    "hpi": "65-year-old male with sudden onset of crushing substernal chest pain that started 2 hours ago while mowing the lawn. Pain is 9/10 in severity, radiating to left arm and jaw. Associated with diaphoresis and nausea. Relieved slightly by rest. Denies prior episodes",
+    "pmh": "Hypertension; Type 2 Diabetes Mellitus; Hyperlipidemia",
+    "meds": "Metformin 1000mg PO BID; Lisinopril 20mg PO daily; Atorvastatin 40mg PO QHS",
+    "allergies": "Penicillin - anaphylaxis; Sulfa - rash",
+    "pe": "BP 165/95, HR 105, RR 20, O2 sat 94% on RA, Temp 37.1°C; General: Anxious, diaphoretic; CV: Tachycardic, regular rhythm, no murmurs; Lungs: Clear bilaterally",
+    "ros": "CV: Chest pain as above, no palpitations; Resp: No dyspnea at rest, no cough; GI: Nausea, no vomiting",
+    "labs": "Troponin I 2.8 ng/mL (elevated); ECG shows ST elevation in leads II, III, aVF",
+    "assessment": "Acute inferior STEMI",
+    "plan": "Aspirin 325mg PO stat given; Plavix 600mg PO stat; Heparin bolus and drip initiated; Activate cath lab for emergent PCI; Cardiology consulted; Admit to CCU; NPO; Serial troponins"
+  }]
+}"""
+    },
+    {
+        "title": "Brief Progress Note",
+        "input": (
+            "Patient continues to have shortness of breath. COPD exacerbation. Currently on albuterol and "
+            "ipratropium nebs q4h. Will add prednisone 40mg daily x 5 days. Pulmonology to see."
+        ),
+        "output": """{
+  "results": [{
+    "cc": "Shortness of breath",
+    "hpi": "Patient continues to have shortness of breath",
+    "pmh": "COPD",
+    "meds": "Albuterol nebs q4h; Ipratropium nebs q4h",
+    "allergies": "",
+    "pe": "",
+    "ros": "",
+    "labs": "",
+    "assessment": "COPD exacerbation",
+    "plan": "Add prednisone 40mg daily x 5 days; Pulmonology to see"
+  }]
+}"""
+    },
+    {
+        "title": "ICU Note with Complex Medications",
+        "input": (
+            "78F admitted with septic shock secondary to UTI. PMH significant for CKD stage 3, atrial "
+            "fibrillation. On vancomycin 1g IV q12h, cefepime 2g IV q8h. NKDA. Vitals: BP 95/60 on norepinephrine "
+            "0.1mcg/kg/min, HR 88 irregular, Temp 38.5°C. Cultures: Blood cultures pending, urine culture grew E. "
+            "coli >100K CFU. Assessment: Septic shock improving, urosepsis, AKI on CKD. Plan: Continue broad "
+            "spectrum antibiotics, wean pressors as tolerated, nephrology following, may need HD if worsens."
+        ),
+        "output": """{
+  "results": [{
+    "cc": "",
+    "hpi": "",
+    "pmh": "CKD stage 3; Atrial fibrillation",
+    "meds": "Vancomycin 1g IV q12h; Cefepime 2g IV q8h; Norepinephrine 0.1mcg/kg/min",
+    "allergies": "NKDA",
+    "pe": "BP 95/60 on norepinephrine 0.1mcg/kg/min, HR 88 irregular, Temp 38.5°C",
+    "ros": "",
+    "labs": "Blood cultures pending; Urine culture grew E. coli >100K CFU",
+    "assessment": "Septic shock improving; Urosepsis; AKI on CKD",
+    "plan": "Continue broad spectrum antibiotics; Wean pressors as tolerated; Nephrology following; May need HD if worsens"
+  }]
+}"""
+    },
+    {
+        "title": "Note Without Explicit Section Headers",
+        "input": (
+            "Patient came in today complaining of fever and cough for the past 5 days. He has a history of asthma "
+            "and hypertension. Takes albuterol inhaler as needed and amlodipine 5mg daily. No known allergies. "
+            "Temperature is 38.9°C, other vitals stable. Lung exam reveals decreased breath sounds in right lower "
+            "lobe with dullness to percussion. Chest X-ray shows right lower lobe consolidation. Likely "
+            "community-acquired pneumonia. Starting azithromycin 500mg PO daily for 5 days and close follow-up in "
+            "48 hours."
+        ),
+        "output": """{
+  "results": [{
+    "cc": "Fever and cough",
+    "hpi": "Fever and cough for the past 5 days",
+    "pmh": "Asthma; Hypertension",
+    "meds": "Albuterol inhaler as needed; Amlodipine 5mg daily",
+    "allergies": "No known allergies",
+    "pe": "Temperature 38.9°C, other vitals stable; Lung exam reveals decreased breath sounds in right lower lobe with dullness to percussion",
+    "ros": "",
+    "labs": "Chest X-ray shows right lower lobe consolidation",
+    "assessment": "Community-acquired pneumonia",
+    "plan": "Starting azithromycin 500mg PO daily for 5 days; Close follow-up in 48 hours"
+  }]
+}"""
+    }
+]
+
+
+# Static instructions go first so every request shares the longest possible
+# prefix (system prompt + these lines) for server-side prompt caching
+USER_PROMPT_INSTRUCTIONS = """Extract structured medical information from the clinical notes below.
+
+**EXTRACTION REQUIREMENTS:**
+- Analyze each note carefully and extract all available information
+- Return a JSON object with a "results" array containing one object per note
+- For an [empty note], return an object with every field set to empty string ""
+- Maintain the order of notes as numbered below
+- Use the short keys from the system prompt (cc, hpi, pmh, meds, allergies, pe, ros, labs, assessment, plan)
+
+**Expected Output Format:**
+{"results": [{...}]}
+"""
+
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _word_counts(text):
+    """Bag-of-words vector (lowercased alphanumeric tokens) used to compare notes"""
+    return Counter(_WORD_PATTERN.findall(text.lower()))
+
+
+def _cosine(a, b):
+    """Cosine similarity of two bag-of-words vectors"""
+    dot = sum(count * b[word] for word, count in a.items() if word in b)
+    if not dot:
+        return 0.0
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm
+
+
+_EXAMPLE_VECTORS = [_word_counts(example["input"]) for example in FEW_SHOT_EXAMPLES]
+
+# Rendered once; every prompt uses one of these strings unchanged
+_RENDERED_EXAMPLES = [
+    f"### Example: {example['title']}\n**Input:**\n\"{example['input']}\"\n\n**Output:**\n{example['output']}"
+    for example in FEW_SHOT_EXAMPLES
+]
+
+# Everything static that shapes the output; hashed into cache keys by the extractor
+PROMPT_FINGERPRINT = SYSTEM_PROMPT + USER_PROMPT_INSTRUCTIONS + "".join(_RENDERED_EXAMPLES)
+
+
+def select_examples(notes_list, k=2):
+    """
+    Pick the few-shot examples most similar to a batch of notes.
+    
+    Args:
+        notes_list (list): Clinical note strings in the batch
+        k (int): Number of examples to return
+        
+    Returns:
+        list: Indices into FEW_SHOT_EXAMPLES, most similar first (original order on ties)
+    """
+    batch_vector = _word_counts(" ".join(notes_list))
+    scores = [_cosine(batch_vector, vector) for vector in _EXAMPLE_VECTORS]
+    return sorted(range(len(FEW_SHOT_EXAMPLES)), key=lambda i: -scores[i])[:k]
+
+
+def get_user_prompt(notes_list, num_examples=2):
     """
     Generate user prompt with clinical notes for extraction.
     
     Args:
         notes_list (list): List of clinical note strings to process
+        num_examples (int): Number of worked examples to include, chosen by similarity to the notes
         
     Returns:
-        str: Formatted prompt with numbered clinical notes and extraction instructions
+        str: Formatted prompt with extraction instructions and examples followed by numbered clinical notes
     """
     if not notes_list:
         return "No clinical notes provided."
     
-    # Format notes with clear numbering
-    notes_text = "\n\n".join([
-        f"**Note {i+1}:**\n{note.strip()}" 
-        for i, note in enumerate(notes_list) if note.strip()
-    ])
+    # Format notes with clear numbering (empty notes keep their slot so results stay aligned)
+    notes_text = "\n\n".join(
+        f"**Note {i+1}:**\n{note.strip() or '[empty note]'}"
+        for i, note in enumerate(notes_list)
+    )
+    note_count = len(notes_list)
     
-    return f"""Extract structured medical information from the following clinical note(s).
+    examples_text = "\n\n".join(_RENDERED_EXAMPLES[i] for i in select_examples(notes_list, num_examples))
+    
+    return f"""{USER_PROMPT_INSTRUCTIONS}
+## EXAMPLES
+
+{examples_text}
 
-    {notes_text}
+## NOTES
 
-    **EXTRACTION REQUIREMENTS:**
-    - Analyze each note carefully and extract all available information
-    - Return a JSON object with a "results" array containing one object per note
-    - Maintain the order of notes as numbered above
-    - Follow the exact field structure and naming from the system prompt
-    - Use semicolons (;) to separate multiple items within the same field
-    - Use empty string "" for any field not present in the note
-    - Return ONLY the JSON output - no explanations, no markdown formatting, no code blocks
+There are {note_count} note(s); the "results" array must contain exactly {note_count} object(s).
 
-    **Expected Output Format:**
-    {{"results": [{{...}}]}}
+{notes_text}
 
-    Begin extraction:"""
+Begin extraction:"""
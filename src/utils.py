@@ -1,9 +1,25 @@
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple, Union
+from typing import List, Dict, Iterator, Tuple, Union
+import csv
+import gzip
 import io
-import json
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, PatternFill, Alignment
+import logging
+import re
+import openpyxl
+import orjson
+import xlsxwriter
+from python_calamine import CalamineWorkbook
+
+logger = logging.getLogger(__name__)
+
+
+class ExcelLoadError(Exception):
+    """Raised when an uploaded file cannot be loaded as clinical notes"""
+
+
+class ExportError(Exception):
+    """Raised when extracted data cannot be merged or written to an export format"""
 
 
 # Centralized field definitions (matches prompts.py - updated to clinical note structure)
@@ -14,6 +30,40 @@ REQUIRED_FIELDS = [
     "Assessment_Impression", "Plan"
 ]
 
+# Set form for fast per-record presence checks
+_REQUIRED_FIELD_SET = frozenset(REQUIRED_FIELDS)
+
+# Fast gzip level for compressed exports; repetitive clinical text still shrinks several-fold
+GZIP_COMPRESS_LEVEL = 1
+
+# Whitespace as str.split() defines it, spelled for Arrow's RE2 engine (its \s is ASCII-only)
+_WHITESPACE_RUN = r"[\s\v\x1c-\x1f\x85\p{Z}]+"
+
+# Rows converted per step when streaming a dataframe into a worksheet
+EXCEL_WRITE_CHUNK_ROWS = 1000
+
+# Widest column set by auto-sizing, in Excel character units
+EXCEL_MAX_COLUMN_WIDTH = 50
+
+# Notes that carry nothing to extract: blank, punctuation only, or placeholder text
+EMPTY_NOTE_PATTERN = re.compile(
+    r"^[\W_]*(?:n/?a|none|nil|null|nan|empty|no notes?|not available|not applicable)?[\W_]*$",
+    re.IGNORECASE
+)
+
+
+def has_clinical_content(note: str) -> bool:
+    """
+    Check whether a note has any content worth sending to the LLM
+    
+    Args:
+        note: Clinical note text
+        
+    Returns:
+        Boolean indicating if the note should be sent for extraction
+    """
+    return bool(note) and EMPTY_NOTE_PATTERN.match(note) is None
+
 
 def load_excel_notes(
     file, 
@@ -38,17 +88,20 @@ def load_excel_notes(
         if file is None:
             raise ValueError("File object is None")
         
-        # Try to read the file
+        # One row past the limit is enough to reject an oversized file without parsing all of it
+        row_limit = max_rows + 1
+        
+        # Try to read the file (calamine's Rust parser handles .xlsx, .xls and .ods)
         try:
-            df = pd.read_excel(file)
+            df = pd.read_excel(file, engine="calamine", nrows=row_limit)
         except Exception as read_error:
             # Try CSV as fallback
             try:
                 file.seek(0)
-                df = pd.read_csv(file)
-                print("ℹ️ File read as CSV instead of Excel")
-            except:
-                raise ValueError(f"Unable to read file as Excel or CSV: {str(read_error)}")
+                df = pd.read_csv(file, nrows=row_limit)
+                logger.info("File read as CSV instead of Excel")
+            except Exception as csv_error:
+                raise ValueError(f"Unable to read file as Excel or CSV: {read_error}") from csv_error
         
         # Check if dataframe is empty
         if df.empty:
@@ -57,7 +110,7 @@ def load_excel_notes(
         # Check row limit
         if len(df) > max_rows:
             raise ValueError(
-                f"File has {len(df)} rows, which exceeds the maximum of {max_rows}. "
+                f"File has more than {max_rows} rows, which exceeds the maximum. "
                 f"Please split your data into smaller files."
             )
         
@@ -71,34 +124,109 @@ def load_excel_notes(
         
         # Handle empty/NaN values - FIXED to maintain alignment
         if fill_empty:
-            # Replace NaN with empty string to maintain row alignment
-            notes = df[notes_column].fillna("").astype(str).tolist()
+            # Replace NaN with empty string to maintain row alignment, in one vectorized pass
+            notes = _collapse_whitespace(df[notes_column]).tolist()
             
             # Count empty notes
-            empty_count = sum(1 for note in notes if not note.strip())
+            empty_count = notes.count("")
             if empty_count > 0:
-                print(f"⚠️ Warning: {empty_count} empty notes found (will be processed as empty)")
+                logger.warning("%d empty notes found (will be processed as empty)", empty_count)
         else:
             # Original behavior: drop NaN (may cause alignment issues)
-            notes = df[notes_column].dropna().astype(str).tolist()
+            notes = _collapse_whitespace(df[notes_column].dropna()).tolist()
             dropped_count = len(df) - len(notes)
             if dropped_count > 0:
-                print(f"⚠️ Warning: {dropped_count} rows with empty notes were dropped")
+                logger.warning("%d rows with empty notes were dropped", dropped_count)
         
-        # Check if we have any valid notes
-        valid_notes = [note for note in notes if note.strip()]
-        if len(valid_notes) == 0:
+        # Check if we have any valid notes (already whitespace-normalized above)
+        if not any(notes):
             raise ValueError(f"No valid notes found in column '{notes_column}' (all empty or NaN)")
         
-        # Clean notes (remove excessive whitespace)
-        notes = [" ".join(note.split()) for note in notes]
-        
         return notes, df
         
-    except ValueError as ve:
-        raise ve
+    except ValueError:
+        raise
     except Exception as e:
-        raise Exception(f"Error loading Excel file: {str(e)}")
+        raise ExcelLoadError(f"Error loading Excel file: {e}") from e
+
+
+def _collapse_whitespace(values: pd.Series) -> pd.Series:
+    """Column as whitespace-collapsed text via Arrow's regex kernels; missing values become "" """
+    # Repeated cells (templated notes, blank fields) are normalized once per distinct value
+    try:
+        codes, uniques = pd.factorize(values)
+    except TypeError:
+        # Unhashable cells (lists, dicts from lenient parsing) are deduplicated by their text
+        codes, uniques = pd.factorize(values.astype(str).where(values.notna()))
+    cleaned = (
+        pd.Series(uniques, dtype=object).astype("string[pyarrow]")
+        .str.replace(_WHITESPACE_RUN, " ", regex=True).str.strip()
+        .to_numpy(dtype=object)
+    )
+    # Missing values have code -1, which picks the trailing ""
+    return pd.Series(np.append(cleaned, "")[codes], index=values.index, dtype=object)
+
+
+def _normalize_note(value) -> str:
+    """Cell value as whitespace-collapsed text; None/NaN become "" """
+    if value is None or pd.isna(value):
+        return ""
+    return " ".join(str(value).split())
+
+
+def iter_excel_notes(file, notes_column: str = "Notes") -> Iterator[str]:
+    """
+    Yield clinical notes from an .xlsx workbook one row at a time
+    
+    Unlike load_excel_notes this never builds a DataFrame, so memory stays
+    flat regardless of sheet size; use it with extract_batch when the
+    original columns are not needed.
+    
+    Args:
+        file: File path or file-like object of an .xlsx workbook
+        notes_column: Name of the column containing notes
+        
+    Yields:
+        Whitespace-normalized note text ("" for empty cells)
+    """
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = _header_names(next(rows, ()))
+        
+        if notes_column not in columns:
+            raise ValueError(
+                f"Column '{notes_column}' not found in Excel file.\n"
+                f"Available columns: {', '.join(map(str, columns))}"
+            )
+        idx = columns.index(notes_column)
+        
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue
+            yield _normalize_note(row[idx] if idx < len(row) else None)
+    finally:
+        workbook.close()
+
+
+def _header_names(header) -> List:
+    """Name blank/duplicate headers the same way pandas does"""
+    columns = []
+    seen = {}
+    for idx, name in enumerate(header):
+        # calamine reports blank cells as "" and every number as a float
+        if name is None or name == "":
+            name = f"Unnamed: {idx}"
+        elif isinstance(name, float) and name.is_integer():
+            name = int(name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
 
 
 def save_to_excel(
@@ -126,102 +254,138 @@ def save_to_excel(
         if not structured_data:
             raise ValueError("Structured data is empty")
         
-        # Convert to DataFrame
-        result_df = pd.DataFrame(structured_data)
+        # Build column-wise on the known schema instead of letting pandas discover keys row by row
+        result_df = pd.DataFrame({
+            field: [row.get(field, "") for row in structured_data]
+            for field in REQUIRED_FIELDS
+        })
         
         # Merge with original dataframe if provided
         if original_df is not None and include_original:
             if len(original_df) != len(result_df):
-                print(f"⚠️ Warning: Length mismatch - Original: {len(original_df)}, Extracted: {len(result_df)}")
-                print(f"   Original data will be saved in separate sheet")
+                logger.warning(
+                    "Length mismatch - Original: %d, Extracted: %d; original data will be saved in a separate sheet",
+                    len(original_df), len(result_df)
+                )
                 
                 # Save both in separate sheets
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    original_df.to_excel(writer, index=False, sheet_name='Original_Data')
-                    result_df.to_excel(writer, index=False, sheet_name='Extracted_Features')
-                    
-                    if add_formatting:
-                        _format_worksheet(writer, 'Original_Data', original_df)
-                        _format_worksheet(writer, 'Extracted_Features', result_df)
-                
-                output.seek(0)
-                return output.getvalue()
+                return _write_workbook([
+                    ('Original_Data', original_df),
+                    ('Extracted_Features', result_df)
+                ], add_formatting)
             
             else:
-                # Handle duplicate column names
-                original_cols = set(original_df.columns)
-                result_cols = set(result_df.columns)
-                duplicates = original_cols.intersection(result_cols)
-                
-                if duplicates:
-                    print(f"⚠️ Warning: Duplicate columns found: {duplicates}")
-                    # Rename duplicates in result
-                    rename_map = {col: f"{col}_extracted" for col in duplicates}
-                    result_df = result_df.rename(columns=rename_map)
-                
-                # Merge horizontally
-                result_df = pd.concat([
-                    original_df.reset_index(drop=True), 
-                    result_df.reset_index(drop=True)
-                ], axis=1)
+                # Merge horizontally (duplicate column names get an _extracted suffix)
+                result_df = merge_dataframes(original_df, result_df)
         
         # Save to bytes with formatting
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            result_df.to_excel(writer, index=False, sheet_name=sheet_name)
-            
-            if add_formatting:
-                _format_worksheet(writer, sheet_name, result_df)
-        
-        output.seek(0)
-        return output.getvalue()
+        return _write_workbook([(sheet_name, result_df)], add_formatting)
         
-    except ValueError as ve:
-        raise ve
+    except ValueError:
+        raise
     except Exception as e:
-        raise Exception(f"Error saving to Excel: {str(e)}")
+        raise ExportError(f"Error saving to Excel: {e}") from e
 
 
-def _format_worksheet(writer, sheet_name: str, df: pd.DataFrame):
+def _write_workbook(sheets: List[Tuple[str, pd.DataFrame]], add_formatting: bool = True) -> bytes:
     """
-    Format Excel worksheet with styling
+    Stream dataframes into an in-memory Excel workbook row by row
+    
+    Uses xlsxwriter in constant_memory mode so each row is flushed as soon
+    as it is written instead of building the full worksheet tree.
     
     Args:
-        writer: ExcelWriter object
-        sheet_name: Name of sheet to format
-        df: DataFrame for column sizing
+        sheets: List of (sheet name, dataframe) pairs
+        add_formatting: Whether to add Excel formatting
+        
+    Returns:
+        Bytes object of Excel file
     """
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'strings_to_urls': False,
+        'strings_to_formulas': False,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss'
+    })
+    
     try:
-        worksheet = writer.sheets[sheet_name]
-        
-        # Format header row
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for cell in worksheet[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Auto-adjust column widths - FIXED for >26 columns
-        for idx, col in enumerate(df.columns, 1):
-            column_letter = get_column_letter(idx)  # Works for any number of columns
+        for sheet_name, df in sheets:
+            _write_worksheet(workbook, sheet_name, df, add_formatting)
+    finally:
+        workbook.close()
+    
+    output.seek(0)
+    return output.getvalue()
+
+
+def _write_worksheet(workbook, sheet_name: str, df: pd.DataFrame, add_formatting: bool = True):
+    """
+    Write a dataframe to a new worksheet in row order, with optional styling
+    
+    Args:
+        workbook: xlsxwriter Workbook object
+        sheet_name: Name of sheet to create
+        df: DataFrame to write
+        add_formatting: Whether to style the header, size columns and freeze the header row
+    """
+    worksheet = workbook.add_worksheet(sheet_name)
+    
+    header_format = None
+    if add_formatting:
+        try:
+            # Format header row
+            header_format = workbook.add_format({
+                'bold': True,
+                'font_color': '#FFFFFF',
+                'bg_color': '#366092',
+                'align': 'center',
+                'valign': 'vcenter'
+            })
             
-            # Calculate max width
-            max_length = max(
-                df[col].astype(str).apply(len).max(),
-                len(str(col))
-            )
-            adjusted_width = min(max_length + 2, 50)
+            # Freeze header row
+            worksheet.freeze_panes(1, 0)
             
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+        except Exception as e:
+            logger.warning("Could not format worksheet: %s", e)
+    
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+    
+    # Column widths are measured chunk by chunk while writing, not in a separate pass
+    widths = [len(str(col)) for col in df.columns]
+    
+    # Convert a chunk at a time so only one slice of object values is resident
+    for start in range(0, len(df), EXCEL_WRITE_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXCEL_WRITE_CHUNK_ROWS]
+        
+        # Columns already at the width cap (e.g. note text) are not measured again
+        open_columns = [idx for idx, width in enumerate(widths) if width + 2 < EXCEL_MAX_COLUMN_WIDTH]
+        if add_formatting and open_columns:
+            # Arrow-backed strings keep the per-cell length computation in C; blanks measure 0
+            chunk_widths = (
+                chunk.iloc[:, open_columns].astype("string[pyarrow]")
+                .apply(lambda column: column.str.len().max()).fillna(0)
+            )
+            for idx, chunk_width in zip(open_columns, chunk_widths.tolist()):
+                widths[idx] = max(widths[idx], int(chunk_width))
         
-        # Freeze header row
-        worksheet.freeze_panes = "A2"
+        # Missing values become blank cells
+        values = chunk.astype(object).where(chunk.notna(), None)
         
-    except Exception as e:
-        print(f"⚠️ Warning: Could not format worksheet: {e}")
+        for row_idx, row in enumerate(values.itertuples(index=False, name=None), start + 1):
+            try:
+                worksheet.write_row(row_idx, 0, row)
+            except TypeError:
+                # Non-scalar values (e.g. lists returned by the LLM) are written as text
+                worksheet.write_row(row_idx, 0, [
+                    value if value is None or isinstance(value, (str, int, float, bool, pd.Timestamp)) else str(value)
+                    for value in row
+                ])
+    
+    if add_formatting:
+        # Column settings are stored until close, so they can follow the streamed rows
+        for idx, width in enumerate(widths):
+            worksheet.set_column(idx, idx, min(width + 2, EXCEL_MAX_COLUMN_WIDTH))
 
 
 def validate_structured_data(data: List[Dict], verbose: bool = False) -> bool:
@@ -230,41 +394,33 @@ def validate_structured_data(data: List[Dict], verbose: bool = False) -> bool:
     
     Args:
         data: List of structured dictionaries
-        verbose: If True, print detailed validation info
+        verbose: If True, log detailed validation info
         
     Returns:
         Boolean indicating if data is valid
     """
-    # Updated to match new clinical note structure
-    required_fields = [
-        "Chief_Complaint", "History_Present_Illness", "Past_Medical_History",
-        "Current_Medications", "Allergies", "Physical_Exam",
-        "Review_of_Systems", "Labs_Imaging_Results", 
-        "Assessment_Impression", "Plan"
-    ]
-    
     # Check if data exists
     if not data or len(data) == 0:
         if verbose:
-            print("❌ Validation failed: Data is empty")
+            logger.warning("Validation failed: Data is empty")
         return False
     
     # Check each item
     for idx, item in enumerate(data, 1):
         if not isinstance(item, dict):
             if verbose:
-                print(f"❌ Validation failed: Record {idx} is not a dictionary")
+                logger.warning("Validation failed: Record %d is not a dictionary", idx)
             return False
         
-        # Check if all required fields are present
-        missing_fields = [field for field in required_fields if field not in item]
-        if missing_fields:
+        # Check if all required fields are present (single C-level subset test per record)
+        if not _REQUIRED_FIELD_SET.issubset(item):
             if verbose:
-                print(f"❌ Validation failed: Record {idx} missing fields: {missing_fields}")
+                missing_fields = [field for field in REQUIRED_FIELDS if field not in item]
+                logger.warning("Validation failed: Record %d missing fields: %s", idx, missing_fields)
             return False
     
     if verbose:
-        print(f"✅ Validation passed: All {len(data)} records have required fields")
+        logger.info("Validation passed: All %d records have required fields", len(data))
     
     return True
 
@@ -279,29 +435,21 @@ def clean_extracted_data(data: List[Dict]) -> List[Dict]:
     Returns:
         Cleaned list of structured dictionaries
     """
-    cleaned_data = []
-    
-    for item in data:
-        cleaned_item = {}
-        
-        # Use REQUIRED_FIELDS to ensure consistency
-        for field in REQUIRED_FIELDS:
-            value = item.get(field, "")
-            
-            # Convert None to empty string
-            if value is None:
-                cleaned_item[field] = ""
-            # Clean string values
-            elif isinstance(value, str):
-                # Remove excessive whitespace
-                cleaned_item[field] = " ".join(value.split()).strip()
-            # Convert other types to string
-            else:
-                cleaned_item[field] = str(value).strip()
-        
-        cleaned_data.append(cleaned_item)
-    
-    return cleaned_data
+    # Use REQUIRED_FIELDS to ensure consistency
+    return [
+        {field: _clean_value(item.get(field, "")) for field in REQUIRED_FIELDS}
+        for item in data
+    ]
+
+
+def _clean_value(value) -> str:
+    """Field value as text, with excessive whitespace removed from strings and None as "" """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    # Convert other types to string
+    return str(value).strip()
 
 
 def get_data_summary(data: List[Dict]) -> Dict:
@@ -344,13 +492,14 @@ def get_data_summary(data: List[Dict]) -> Dict:
     }
 
 
-def export_to_csv(structured_data: List[Dict], include_bom: bool = True) -> bytes:
+def export_to_csv(structured_data: List[Dict], include_bom: bool = True, compress: bool = False) -> bytes:
     """
     Export structured data to CSV format
     
     Args:
         structured_data: List of structured feature dictionaries
         include_bom: Include UTF-8 BOM for Excel compatibility
+        compress: If True, return gzip-compressed bytes (serve as .csv.gz)
         
     Returns:
         Bytes object of CSV file
@@ -359,53 +508,66 @@ def export_to_csv(structured_data: List[Dict], include_bom: bool = True) -> byte
         if not structured_data:
             raise ValueError("Cannot export empty data to CSV")
         
-        # Convert to DataFrame
-        df = pd.DataFrame(structured_data)
+        # Every key seen in any record, in first-seen order
+        columns = list(dict.fromkeys(key for item in structured_data for key in item))
         
         # Reorder columns using REQUIRED_FIELDS
-        existing_fields = [f for f in REQUIRED_FIELDS if f in df.columns]
-        remaining_fields = [f for f in df.columns if f not in existing_fields]
-        df = df[existing_fields + remaining_fields]
+        existing_fields = [f for f in REQUIRED_FIELDS if f in columns]
+        remaining_fields = [f for f in columns if f not in existing_fields]
         
-        # Convert to CSV
-        csv_string = df.to_csv(index=False)
+        # Rows are encoded (and optionally compressed) as they are written, with no full text copy
+        output = io.BytesIO()
+        sink = gzip.GzipFile(fileobj=output, mode="wb", compresslevel=GZIP_COMPRESS_LEVEL) if compress else output
         
         # Encode with optional BOM for Excel compatibility
-        if include_bom:
-            return '\ufeff'.encode('utf-8') + csv_string.encode('utf-8')
-        else:
-            return csv_string.encode('utf-8')
+        text = io.TextIOWrapper(sink, encoding='utf-8-sig' if include_bom else 'utf-8', newline="")
+        
+        # Write rows straight from the dicts; missing keys become empty cells
+        writer = csv.DictWriter(text, fieldnames=existing_fields + remaining_fields, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(structured_data)
+        
+        # Detach (which flushes) rather than close, so the BytesIO stays readable
+        text.detach()
+        if compress:
+            sink.close()  # writes the gzip trailer; output itself stays open
         
-    except ValueError as ve:
-        raise ve
+        return output.getvalue()
+        
+    except ValueError:
+        raise
     except Exception as e:
-        raise Exception(f"Error exporting to CSV: {str(e)}")
+        raise ExportError(f"Error exporting to CSV: {e}") from e
 
 
-def export_to_json(structured_data: List[Dict], pretty: bool = True) -> str:
+def export_to_json(structured_data: List[Dict], pretty: bool = True, compress: bool = False) -> Union[str, bytes]:
     """
     Export structured data to JSON format
     
     Args:
         structured_data: List of structured feature dictionaries
         pretty: If True, format with indentation
+        compress: If True, return gzip-compressed UTF-8 bytes (serve as .json.gz)
         
     Returns:
-        JSON string
+        JSON string, or compressed bytes when compress is True
     """
     try:
         if not structured_data:
             raise ValueError("Cannot export empty data to JSON")
         
-        if pretty:
-            return json.dumps(structured_data, indent=2, ensure_ascii=False)
-        else:
-            return json.dumps(structured_data, ensure_ascii=False)
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        data = orjson.dumps(structured_data, option=option)
+        if compress:
+            return gzip.compress(data, compresslevel=GZIP_COMPRESS_LEVEL)
+        return data.decode("utf-8")
         
-    except (TypeError, ValueError) as e:
-        raise ValueError(f"Data is not JSON serializable: {str(e)}")
+    except orjson.JSONEncodeError as e:
+        raise ValueError(f"Data is not JSON serializable: {e}") from e
+    except ValueError:
+        raise
     except Exception as e:
-        raise Exception(f"Error exporting to JSON: {str(e)}")
+        raise ExportError(f"Error exporting to JSON: {e}") from e
 
 
 def filter_empty_records(data: List[Dict]) -> Tuple[List[Dict], int]:
@@ -421,22 +583,54 @@ def filter_empty_records(data: List[Dict]) -> Tuple[List[Dict], int]:
     if not data:
         return [], 0
     
-    filtered_data = []
-    removed_count = 0
+    # Keep records where at least one field has a non-empty value
+    filtered_data = [
+        item for item in data
+        if any(value and str(value).strip() for value in item.values())
+    ]
+    removed_count = len(data) - len(filtered_data)
+    
+    return filtered_data, removed_count
+
+
+def normalize_data(data: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    Validate, clean and filter records in a single pass
+    
+    Equivalent to dropping the records validate_structured_data would reject,
+    then clean_extracted_data followed by filter_empty_records, but each
+    record is visited only once. Items that are not dictionaries or lack a
+    required field are dropped along with records that have no populated field.
     
+    Args:
+        data: List of structured dictionaries
+        
+    Returns:
+        Tuple of (cleaned records with exactly REQUIRED_FIELDS, count of removed records)
+    """
+    if not data:
+        return [], 0
+    
+    cleaned_data = []
     for item in data:
-        # Check if at least one field has a non-empty value
-        has_value = any(
-            value and str(value).strip() 
-            for value in item.values()
-        )
-        
-        if has_value:
-            filtered_data.append(item)
-        else:
-            removed_count += 1
+        # Same schema check as validate_structured_data
+        if not isinstance(item, dict) or not _REQUIRED_FIELD_SET.issubset(item):
+            continue
+        
+        cleaned_item = {field: _clean_value(item[field]) for field in REQUIRED_FIELDS}
+        # Cleaned values are stripped strings, so any non-empty one is populated
+        if any(cleaned_item.values()):
+            cleaned_data.append(cleaned_item)
     
-    return filtered_data, removed_count
+    return cleaned_data, len(data) - len(cleaned_data)
+
+
+def _with_default_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Return df with a 0-based RangeIndex, skipping reset_index when it already has one"""
+    index = df.index
+    if isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1:
+        return df
+    return df.reset_index(drop=True)
 
 
 def merge_dataframes(original_df: pd.DataFrame, extracted_df: pd.DataFrame) -> pd.DataFrame:
@@ -458,9 +652,9 @@ def merge_dataframes(original_df: pd.DataFrame, extracted_df: pd.DataFrame) -> p
                 f"extracted has {len(extracted_df)} rows"
             )
         
-        # Work on copies to avoid modifying originals
-        original_copy = original_df.copy().reset_index(drop=True)
-        extracted_copy = extracted_df.copy().reset_index(drop=True)
+        # Align on a fresh 0..n-1 index; never modifies the originals
+        original_copy = _with_default_index(original_df)
+        extracted_copy = _with_default_index(extracted_df)
         
         # Handle duplicate column names
         original_cols = set(original_copy.columns)
@@ -468,19 +662,53 @@ def merge_dataframes(original_df: pd.DataFrame, extracted_df: pd.DataFrame) -> p
         duplicates = original_cols.intersection(extracted_cols)
         
         if duplicates:
-            print(f"ℹ️ Found {len(duplicates)} duplicate column(s), renaming...")
+            logger.info("Found %d duplicate column(s), renaming...", len(duplicates))
             rename_map = {col: f"{col}_extracted" for col in duplicates}
             extracted_copy = extracted_copy.rename(columns=rename_map)
         
-        # Concatenate horizontally
-        merged_df = pd.concat([original_copy, extracted_copy], axis=1)
+        # Concatenate horizontally; neither side is mutated afterwards, so reuse their blocks
+        merged_df = pd.concat([original_copy, extracted_copy], axis=1, copy=False)
         
         return merged_df
         
-    except ValueError as ve:
-        raise ve
+    except ValueError:
+        raise
     except Exception as e:
-        raise Exception(f"Error merging dataframes: {str(e)}")
+        raise ExportError(f"Error merging dataframes: {e}") from e
+
+
+def _file_size(file) -> int:
+    """Size of an uploaded file in bytes, without touching its contents when possible"""
+    # Streamlit's UploadedFile knows its size up front
+    size = getattr(file, "size", None)
+    if size is not None:
+        return size
+    
+    # BytesIO exposes its buffer directly; release the view so the buffer can still change
+    if hasattr(file, "getbuffer"):
+        with file.getbuffer() as view:
+            return view.nbytes
+    
+    file.seek(0, 2)  # Seek to end
+    size = file.tell()
+    file.seek(0)  # Reset to beginning
+    return size
+
+
+def _probe_csv(file) -> Tuple[int, List]:
+    """Header names and data row count of a CSV upload, without building a dataframe"""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError("No columns to parse from file")
+        # Blank lines are skipped, matching pandas' default
+        rows = sum(1 for row in reader if row)
+        return rows, _header_names(header)
+    finally:
+        # Detach so closing the wrapper never closes the upload itself
+        text.detach()
 
 
 def validate_excel_file(file, max_size_mb: int = 50) -> Dict:
@@ -507,10 +735,7 @@ def validate_excel_file(file, max_size_mb: int = 50) -> Dict:
     
     try:
         # Check file size
-        file.seek(0, 2)  # Seek to end
-        file_size = file.tell()
-        file.seek(0)  # Reset to beginning
-        
+        file_size = _file_size(file)
         file_size_mb = file_size / (1024 * 1024)
         result["file_size_mb"] = round(file_size_mb, 2)
         
@@ -519,15 +744,20 @@ def validate_excel_file(file, max_size_mb: int = 50) -> Dict:
             file.seek(0)  # Reset pointer
             return result
         
-        # Try reading as Excel
+        # Try reading as Excel; only the header row and sheet dimensions are needed
         try:
-            df = pd.read_excel(file)
+            sheet = CalamineWorkbook.from_filelike(file).get_sheet_by_index(0)
+            # Lay the sheet out from A1 like pandas' calamine reader (and so load_excel_notes):
+            # row 1 is the header even when blank, and the data runs to the last used row
+            header = next(iter(sheet.to_python(skip_empty_area=False, nrows=1)), [])
+            rows = sheet.end[0] if sheet.end else 0
+            column_names = _header_names(header)
             result["file_type"] = "Excel"
         except:
             # Try CSV as fallback
             file.seek(0)
             try:
-                df = pd.read_csv(file)
+                rows, column_names = _probe_csv(file)
                 result["file_type"] = "CSV"
             except Exception as csv_error:
                 result["error"] = f"Unable to read as Excel or CSV: {str(csv_error)}"
@@ -538,10 +768,10 @@ def validate_excel_file(file, max_size_mb: int = 50) -> Dict:
         file.seek(0)
         
         # Populate validation results
-        result["rows"] = len(df)
-        result["columns"] = len(df.columns)
-        result["column_names"] = df.columns.tolist()
-        result["has_data"] = len(df) > 0 and len(df.columns) > 0
+        result["rows"] = rows
+        result["columns"] = len(column_names)
+        result["column_names"] = column_names
+        result["has_data"] = rows > 0 and len(column_names) > 0
         result["valid"] = result["has_data"]
         
         return result
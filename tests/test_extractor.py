@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+import types
+
+import orjson
+
+from src.extractor import ClinicalNotesExtractor
+
+NOTES = [f"Patient {index} reports chest pain" for index in range(6)]
+
+
+def _response():
+    content = orjson.dumps({"results": [{"cc": "Chest pain"}]}).decode()
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+
+def _stub_extractor(latency=0.02):
+    """Extractor whose sync and async clients answer every request with one record after `latency`"""
+    extractor = ClinicalNotesExtractor("test-key", "test-model")
+    starts = []
+    lock = threading.Lock()
+
+    def create(**request):
+        with lock:
+            starts.append(time.monotonic())
+        time.sleep(latency)
+        return _response()
+
+    async def acreate(**request):
+        starts.append(time.monotonic())
+        await asyncio.sleep(latency)
+        return _response()
+
+    async def close():
+        pass
+
+    completions = types.SimpleNamespace(create=create, acreate=acreate)
+    extractor.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    async_client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    extractor._get_async_client = lambda: async_client
+    extractor._close_async_client = close
+    return extractor, starts
+
+
+def _assert_back_to_back(starts):
+    assert len(starts) == len(NOTES)
+    assert max(later - earlier for earlier, later in zip(starts, starts[1:])) < 0.2
+
+
+def test_extract_batch_default_sends_concurrent_requests_back_to_back():
+    extractor, starts = _stub_extractor()
+
+    results = extractor.extract_batch(NOTES, batch_size=1)
+
+    assert [result["Chief_Complaint"] for result in results] == ["Chest pain"] * len(NOTES)
+    _assert_back_to_back(starts)
+
+
+def test_extract_batch_default_sends_sequential_requests_back_to_back():
+    extractor, starts = _stub_extractor()
+
+    extractor.extract_batch(NOTES, batch_size=1, max_concurrency=1)
+
+    _assert_back_to_back(sorted(starts))
+
+
+def test_extract_batch_inside_running_loop_sends_requests_back_to_back():
+    extractor, starts = _stub_extractor()
+
+    async def run_in_loop():
+        # A running loop (e.g. Jupyter) routes extract_batch to the thread pool
+        return extractor.extract_batch(NOTES, batch_size=1)
+
+    results = asyncio.run(run_in_loop())
+
+    assert len(results) == len(NOTES)
+    _assert_back_to_back(sorted(starts))
@@ -0,0 +1,77 @@
+import io
+
+import pandas as pd
+import xlsxwriter
+
+from src.utils import (
+    REQUIRED_FIELDS, _collapse_whitespace, clean_extracted_data, get_data_summary, normalize_data,
+    validate_excel_file,
+)
+
+
+def _record(**fields):
+    return {**dict.fromkeys(REQUIRED_FIELDS, ""), **fields}
+
+
+def test_collapse_whitespace_handles_unhashable_values():
+    values = pd.Series([["x", "y"], None, {"a": 1}, "  b \n c ", ["x", "y"]])
+
+    assert _collapse_whitespace(values).tolist() == ["['x', 'y']", "", "{'a': 1}", "b c", "['x', 'y']"]
+
+
+def test_clean_extracted_data_stringifies_list_and_dict_fields():
+    cleaned = clean_extracted_data([{"Plan": ["x", "y"], "Allergies": {"penicillin": "rash"}}])
+
+    assert cleaned[0]["Plan"] == "['x', 'y']"
+    assert cleaned[0]["Allergies"] == "{'penicillin': 'rash'}"
+    assert cleaned[0]["Chief_Complaint"] == ""
+
+
+def test_normalize_data_keeps_records_with_list_fields():
+    records, removed = normalize_data([_record(Plan=["x"]), _record(Plan="  ")])
+
+    assert [record["Plan"] for record in records] == ["['x']"]
+    assert removed == 1
+
+
+def test_normalize_data_drops_invalid_and_empty_records():
+    data = [_record(Plan=" rest \n fluids "), {"Plan": "missing other fields"}, "not a record", _record()]
+
+    records, removed = normalize_data(data)
+
+    assert records == [_record(Plan="rest fluids")]
+    assert removed == 3
+
+
+def test_get_data_summary_counts_truthy_non_blank_values():
+    summary = get_data_summary([_record(Plan=0, Allergies=float("nan"), Chief_Complaint="  "), _record(Plan="rest")])
+
+    assert summary["fields_populated"]["Plan"]["count"] == 1
+    assert summary["fields_populated"]["Allergies"]["count"] == 1
+    assert summary["fields_populated"]["Chief_Complaint"]["count"] == 0
+    assert summary["completion_rate"] == 10.0
+
+
+def _workbook(cells):
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer)
+    worksheet = workbook.add_worksheet()
+    for (row, col), value in cells.items():
+        worksheet.write(row, col, value)
+    workbook.close()
+    return buffer.getvalue()
+
+
+def test_validate_excel_file_matches_pandas_layout():
+    cases = [
+        {(0, 0): "Notes", (0, 2): "x", (0, 4): 2023, (1, 3): "v", (2, 0): "note"},
+        {(2, 0): "Notes", (2, 1): "Plan", **{(row, 0): "note" for row in range(3, 8)}},
+    ]
+    for cells in cases:
+        data = _workbook(cells)
+        expected = pd.read_excel(io.BytesIO(data), engine="calamine")
+
+        result = validate_excel_file(io.BytesIO(data))
+
+        assert result["rows"] == len(expected)
+        assert result["column_names"] == expected.columns.tolist()